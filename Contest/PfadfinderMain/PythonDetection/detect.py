@@ -3,9 +3,12 @@ import os
 import argparse
 import numpy as np
 from ultralytics import YOLO # type: ignore
+from ultralytics.utils import LOGGER # type: ignore
 import json
 from pathlib import Path
 import uuid
+import gzip
+import time
 
 #!/usr/bin/env python3
 
@@ -19,22 +22,41 @@ def parse_arguments():
     parser.add_argument('--no-draw', action='store_true', help='Skip drawing on images, only output JSON')
     parser.add_argument('--json', action='store_true', help='Output detection results as JSON')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
+    parser.add_argument('--ndjson', nargs='?', const='-', default=None, metavar='PATH',
+                        help='Stream one compact JSON record per image to stdout or to an appendable file (.gz for gzip)')
     return parser.parse_args()
 
+def open_ndjson_sink(path):
+    """Open the NDJSON output: stdout for '-', otherwise a file opened for appending"""
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        # Every flush ends a deflate block, so readers can decompress while the run is going
+        return gzip.open(path, 'at', encoding='utf-8')
+    return open(path, 'a', encoding='utf-8')
+
 def main():
     args = parse_arguments()
     
+    # With NDJSON on stdout all other messages go to stderr to keep the stream parseable
+    ndjson_to_stdout = args.ndjson == '-'
+    log = sys.stderr if ndjson_to_stdout else sys.stdout
+    if ndjson_to_stdout:
+        # ultralytics logs to stdout (model loading, "Results saved to ...")
+        for handler in LOGGER.handlers:
+            handler.setStream(sys.stderr)
+    
     # Check if image path exists (can be file or directory)
     if not os.path.exists(args.image):
-        print(f"Error: Path not found: {args.image}")
+        print(f"Error: Path not found: {args.image}", file=log)
         return 1
     
     # Load YOLO model
     try:
         model = YOLO(args.model, task='detect')
-        print(f"Model loaded: {args.model}")
+        print(f"Model loaded: {args.model}", file=log)
     except Exception as e:
-        print(f"Error loading model: {e}")
+        print(f"Error loading model: {e}", file=log)
         return 1
     
     # Parse classes if provided
@@ -42,21 +64,30 @@ def main():
     if args.classes:
         try:
             classes = [int(c) for c in args.classes.split(',')]
-            print(f"Filtering by classes: {classes}")
+            print(f"Filtering by classes: {classes}", file=log)
         except ValueError:
-            print("Error: Classes must be comma-separated integers")
+            print("Error: Classes must be comma-separated integers", file=log)
             return 1
     
     # Create output directory if it doesn't exist
     output_dir = args.output if args.output else 'output'
     if not os.path.exists(output_dir) and (args.output or args.json):
         os.makedirs(output_dir)
-        print(f"Created output directory: {output_dir}")
+        print(f"Created output directory: {output_dir}", file=log)
+    
+    ndjson_sink = open_ndjson_sink(args.ndjson) if args.ndjson else None
     
     # Perform detection
     try:
         # Will handle both single image and directory
-        print(f"Running detection on: {args.image}")
+        print(f"Running detection on: {args.image}", file=log)
+        
+        extra_args = {}
+        if ndjson_sink:
+            # Stream results so every record is written as soon as its image is done
+            extra_args['stream'] = True
+            extra_args['verbose'] = args.verbose
+        
         results = model(
             source=args.image,
             conf=args.conf,
@@ -66,11 +97,14 @@ def main():
             save_conf=True,
             project=output_dir,
             name='',
-            exist_ok=True
+            exist_ok=True,
+            **extra_args
         )
-        print(f"Detected {len(results)} objects")
+        if not ndjson_sink:
+            print(f"Detected {len(results)} objects")
         
         # Process results
+        image_start = time.perf_counter()
         for i, r in enumerate(results):
             # Get the input file path from the result object
             input_path = r.path
@@ -101,7 +135,29 @@ def main():
                 }
                 
                 detections.append(detection)
-                print(f"{cls_name},{conf:.2f},{int(x1)},{int(y1)},{int(x2)},{int(y2)}")
+                if not ndjson_sink:
+                    print(f"{cls_name},{conf:.2f},{int(x1)},{int(y1)},{int(x2)},{int(y2)}")
+            
+            # Stream one compact record per image
+            if ndjson_sink:
+                image_end = time.perf_counter()
+                record = {
+                    'index': i,
+                    'image': input_path,
+                    'image_width': r.orig_shape[1],
+                    'image_height': r.orig_shape[0],
+                    'detections': detections,
+                    'count': len(detections),
+                    'timing': {
+                        'preprocess_ms': r.speed.get('preprocess'),
+                        'inference_ms': r.speed.get('inference'),
+                        'postprocess_ms': r.speed.get('postprocess'),
+                        'total_ms': (image_end - image_start) * 1000
+                    }
+                }
+                ndjson_sink.write(json.dumps(record, separators=(',', ':')) + '\n')
+                ndjson_sink.flush()
+                image_start = image_end
             
             # Save JSON output if requested
             if args.json:
@@ -112,14 +168,18 @@ def main():
                 json_path = os.path.join(output_dir, f"{filename}_detection.json")
                 with open(json_path, 'w') as f:
                     json.dump(json_output, f, indent=2)
-                print(f"JSON output saved to: {json_path}")
+                print(f"JSON output saved to: {json_path}", file=log)
     
     except Exception as e:
-        print(f"Error during detection: {e}")
+        print(f"Error during detection: {e}", file=log)
         import traceback
         traceback.print_exc()
         return 1
     
+    finally:
+        if ndjson_sink and ndjson_sink is not sys.stdout:
+            ndjson_sink.close()
+    
     return 0
 
 if __name__ == "__main__":
@@ -22,9 +22,12 @@ namespace YoloService.Handlers
                         response = "ok",
                         server = "YoloService",
                         model_loaded = yoloService.IsModelLoaded,
+                        model = yoloService.IsModelLoaded ? await yoloService.GetModelStatusAsync() : null,
                         timestamp = DateTime.Now
                     }),
                     "detect" => await HandleDetection(jsonDoc.RootElement, yoloService),
+                    "load_model" => await HandleLoadModel(jsonDoc.RootElement, yoloService),
+                    "memory" => await HandleMemory(jsonDoc.RootElement, yoloService),
                     "echo" => JsonSerializer.Serialize(new
                     {
                         response = "echo",
@@ -45,6 +48,51 @@ namespace YoloService.Handlers
             }
         }
 
+        private static async Task<string> HandleLoadModel(JsonElement element, YoloDetectionService yoloService)
+        {
+            var modelPath = element.TryGetProperty("model_path", out var pathProp) ? pathProp.GetString() : null;
+
+            if (string.IsNullOrEmpty(modelPath))
+            {
+                return JsonSerializer.Serialize(new
+                {
+                    response = "error",
+                    message = "model_path is required",
+                    timestamp = DateTime.Now
+                });
+            }
+
+            var result = await yoloService.LoadModelAsync(modelPath);
+
+            // The server refuses the load when the file is missing or another model is still loading
+            var failed = result is JsonElement json
+                && json.TryGetProperty("status", out var statusProp)
+                && statusProp.GetString() == "error";
+
+            return JsonSerializer.Serialize(new
+            {
+                response = failed ? "error" : "model_loading",
+                result = result,
+                timestamp = DateTime.Now
+            });
+        }
+
+        private static async Task<string> HandleMemory(JsonElement element, YoloDetectionService yoloService)
+        {
+            var top = element.TryGetProperty("top", out var topProp) ? topProp.GetInt32() : 10;
+            // "start" / "stop" toggles tracemalloc in the Python server
+            var tracemalloc = element.TryGetProperty("tracemalloc", out var traceProp) ? traceProp.GetString() : null;
+
+            var result = await yoloService.GetMemoryStatusAsync(top, tracemalloc);
+
+            return JsonSerializer.Serialize(new
+            {
+                response = "memory",
+                result = result,
+                timestamp = DateTime.Now
+            });
+        }
+
         private static async Task<string> HandleDetection(JsonElement element, YoloDetectionService yoloService)
         {
             try
@@ -183,7 +183,7 @@ if __name__ == '__main__':
             }
         }
 
-        public async Task CreateDetectionServerScriptAsync(string modelPath = "models/prendet_v4.onnx")
+        public async Task CreateDetectionServerScriptAsync()
         {
             var serverScriptPath = Path.Combine(AppDomain.CurrentDomain.BaseDirectory, "detect_server.py");
             var scriptContent = @"#!/usr/bin/env python3
@@ -197,6 +197,10 @@ import threading
 import time
 import contextlib
 import io
+import gc
+import argparse
+import resource
+import tracemalloc
 
 # Suppress all warnings and output from imports
 import warnings
@@ -206,6 +210,9 @@ warnings.filterwarnings('ignore')
 with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
     try:
         from ultralytics import YOLO
+        import numpy as np
+        import cv2
+        import torch
     except ImportError as e:
         print(f'Failed to import ultralytics: {e}', file=sys.stderr)
         sys.exit(1)
@@ -214,17 +221,227 @@ with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.St
 model = None
 model_lock = threading.Lock()
 
-def load_model(model_path='models/pren_det_v3.onnx'):
-    global model
-    try:
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f'Model file not found: {model_path}')
+# Model currently serving requests and the one being loaded in the background (if any)
+model_info = {}
+pending_load = None
+last_load_error = None
+load_state_lock = threading.Lock()
+
+# Memory bookkeeping for long running servers
+server_args = None
+buffer_pool = None
+requests_served = 0
+restarts = int(os.environ.get('DETECT_SERVER_RESTARTS', '0'))
+baseline_rss_mb = None
+restart_disabled = None
+last_snapshot = None
+
+# Restarting cannot help when the freshly started server already uses most of the budget
+RESTART_BASELINE_SHARE = 0.8
+
+class BufferPool:
+    # Decode and preprocess buffers at the model input shape, allocated once and reused for every request
+    def __init__(self, imgsz):
+        self.imgsz = list(imgsz)
+        height, width = self.imgsz
+        self.file_buffer = bytearray(4 * 1024 * 1024)
+        self.canvas = np.full((height, width, 3), 114, dtype=np.uint8)
+        self.tensor = np.empty((1, 3, height, width), dtype=np.float32)
+        # Shares memory with self.tensor, ultralytics uses tensor input as is (already letterboxed)
+        self.torch_tensor = torch.from_numpy(self.tensor)
+        self.file_buffer_grows = 0
+        self.uses = 0
+        self.gain = 1.0
+        self.pad = (0, 0)
+        self.shape = (height, width)
+    
+    def read_file(self, path):
+        size = os.path.getsize(path)
+        if size > len(self.file_buffer):
+            self.file_buffer = bytearray(size + size // 4)
+            self.file_buffer_grows += 1
+        view = memoryview(self.file_buffer)[:size]
+        with open(path, 'rb', buffering=0) as f:
+            f.readinto(view)
+        return np.frombuffer(view, dtype=np.uint8)
+    
+    def preprocess(self, path):
+        # Letterbox like ultralytics, but into the preallocated canvas and tensor
+        image = cv2.imdecode(self.read_file(path), cv2.IMREAD_COLOR)
+        if image is None:
+            raise Exception(f'Could not decode image: {path}')
+        
+        height, width = self.imgsz
+        h0, w0 = image.shape[:2]
+        gain = min(height / h0, width / w0)
+        new_w, new_h = int(round(w0 * gain)), int(round(h0 * gain))
+        left = int(round((width - new_w) / 2 - 0.1))
+        top = int(round((height - new_h) / 2 - 0.1))
+        
+        self.canvas.fill(114)
+        target = self.canvas[top:top + new_h, left:left + new_w]
+        if (new_w, new_h) == (w0, h0):
+            target[...] = image
+        else:
+            cv2.resize(image, (new_w, new_h), dst=target, interpolation=cv2.INTER_LINEAR)
+        
+        # BGR HWC uint8 -> RGB CHW float in [0, 1]
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), np.float32(1 / 255), out=self.tensor[0])
         
+        self.gain = gain
+        self.pad = (left, top)
+        self.shape = (h0, w0)
+        self.uses += 1
+        return self.torch_tensor
+    
+    def scale_boxes(self, xyxy):
+        # Map boxes from the letterboxed input back to the original image
+        h0, w0 = self.shape
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - self.pad[0]) / self.gain).clip(0, w0)
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - self.pad[1]) / self.gain).clip(0, h0)
+        return xyxy
+    
+    def stats(self):
+        return {
+            'imgsz': self.imgsz,
+            'uses': self.uses,
+            'file_buffer_kb': len(self.file_buffer) // 1024,
+            'file_buffer_grows': self.file_buffer_grows,
+            'pooled_mb': (len(self.file_buffer) + self.canvas.nbytes + self.tensor.nbytes) / (1024 * 1024)
+        }
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # No procfs (not Linux): fall back to the peak value
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def format_stat(stat):
+    frame = stat.traceback[0]
+    entry = {
+        'location': f'{frame.filename}:{frame.lineno}',
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count
+    }
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff_kb'] = round(stat.size_diff / 1024, 1)
+        entry['count_diff'] = stat.count_diff
+    return entry
+
+def get_memory_status(top=10, trace=None):
+    global last_snapshot
+    if trace == 'start' and not tracemalloc.is_tracing():
+        tracemalloc.start(server_args.tracemalloc_frames)
+    elif trace == 'stop' and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        last_snapshot = None
+    
+    status = {
+        'status': 'ok',
+        'rss_mb': current_rss_mb(),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'max_rss_mb': server_args.max_rss_mb,
+        'baseline_rss_mb': baseline_rss_mb,
+        'requests': requests_served,
+        'restarts': restarts,
+        'max_restarts': server_args.max_restarts,
+        'restart_disabled': restart_disabled,
+        'buffer_pool': buffer_pool.stats() if buffer_pool else None,
+        'tracemalloc': tracemalloc.is_tracing()
+    }
+    
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ])
+        status['traced_mb'] = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+        status['top_allocations'] = [format_stat(s) for s in snapshot.statistics('lineno')[:top]]
+        # Growth since the previous memory command shows where memory keeps accumulating
+        if last_snapshot is not None:
+            status['top_growth'] = [format_stat(s) for s in snapshot.compare_to(last_snapshot, 'lineno')[:top]]
+        last_snapshot = snapshot
+    
+    return status
+
+def restart_server(rss_mb):
+    # Re-exec in place: the PID and the stdin/stdout pipes stay the same, so the .NET side only sees a slow request
+    print(f'RSS {rss_mb:.0f} MB exceeds limit of {server_args.max_rss_mb} MB, restarting', file=sys.stderr, flush=True)
+    sys.stdout.flush()
+    
+    argv = [
+        sys.executable, os.path.abspath(__file__),
+        '--model', model_info.get('model_path', server_args.model),
+        '--max-rss-mb', str(server_args.max_rss_mb),
+        '--max-restarts', str(server_args.max_restarts),
+        '--imgsz', str(server_args.imgsz),
+        '--tracemalloc-frames', str(server_args.tracemalloc_frames)
+    ]
+    if server_args.no_buffer_pool:
+        argv.append('--no-buffer-pool')
+    if tracemalloc.is_tracing():
+        argv.append('--tracemalloc')
+    
+    os.environ['DETECT_SERVER_RESTARTS'] = str(restarts + 1)
+    os.execv(sys.executable, argv)
+
+def check_memory_limit():
+    # Restart between requests once the process has grown past its memory budget
+    global restart_disabled
+    if not server_args.max_rss_mb or restart_disabled or pending_load is not None:
+        return
+    
+    rss_mb = current_rss_mb()
+    if rss_mb <= server_args.max_rss_mb:
+        return
+    
+    # DETECT_SERVER_RESTARTS survives the re-exec, so this caps restarts over the lifetime of the process
+    if restarts >= server_args.max_restarts:
+        restart_disabled = f'restart limit of {server_args.max_restarts} reached'
+        print(f'RSS {rss_mb:.0f} MB exceeds limit of {server_args.max_rss_mb} MB, not restarting: {restart_disabled}',
+              file=sys.stderr, flush=True)
+        return
+    
+    restart_server(rss_mb)
+
+def model_input_size(yolo_model):
+    # Exported models carry their input size in the metadata (kept by AutoBackend after the warm-up),
+    # other models fall back to --imgsz
+    imgsz = getattr(getattr(yolo_model.predictor, 'model', None), 'imgsz', None) or server_args.imgsz
+    return [imgsz, imgsz] if isinstance(imgsz, int) else list(imgsz)
+
+def create_model(model_path):
+    # Load and warm up a model without touching the one currently serving requests
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f'Model file not found: {model_path}')
+    
+    start = time.time()
+    new_model = YOLO(model_path, task='detect')
+    load_time = time.time() - start
+    
+    # The first inference initialises the runtime session, do it before serving
+    start = time.time()
+    new_model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+    warmup_time = time.time() - start
+    
+    info = {
+        'model_path': model_path,
+        'imgsz': model_input_size(new_model),
+        'load_time': load_time,
+        'warmup_time': warmup_time,
+        'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    return new_model, info
+
+def load_model(model_path='models/prendet_v4.onnx'):
+    global model, model_info
+    try:
         print(f'Loading model from: {model_path}', file=sys.stderr)
         
         # Suppress all output during model loading
         with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-            model = YOLO(model_path, task='detect')
+            model, model_info = create_model(model_path)
         
         print(f'Model loaded successfully', file=sys.stderr)
         return True
@@ -233,6 +450,54 @@ def load_model(model_path='models/pren_det_v3.onnx'):
         traceback.print_exc(file=sys.stderr)
         return False
 
+def swap_model_in_background(model_path):
+    global model, model_info, buffer_pool, pending_load, last_load_error
+    try:
+        # No output redirection here: it is process wide and would swallow responses of the serving thread
+        new_model, info = create_model(model_path)
+        
+        # Taking the lock waits for a running detection, so the swap happens between requests;
+        # the buffer pool has to match the new model's input size
+        with model_lock:
+            old_model = model
+            model = new_model
+            model_info = info
+            if buffer_pool is not None and buffer_pool.imgsz != info['imgsz']:
+                buffer_pool = BufferPool(info['imgsz'])
+        
+        # Release the old runtime session
+        del old_model
+        gc.collect()
+        last_load_error = None
+        print(f'Switched to model: {model_path}', file=sys.stderr)
+    except Exception as e:
+        last_load_error = f'{model_path}: {e}'
+        print(f'Error loading model: {e}', file=sys.stderr)
+    finally:
+        with load_state_lock:
+            pending_load = None
+
+def start_model_load(model_path):
+    global pending_load
+    with load_state_lock:
+        if pending_load is not None:
+            loading_path = pending_load['model_path']
+            return {'status': 'error', 'message': f'Model {loading_path} is already loading'}
+        if not os.path.exists(model_path):
+            return {'status': 'error', 'message': f'Model file not found: {model_path}'}
+        pending_load = {'model_path': model_path, 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    
+    threading.Thread(target=swap_model_in_background, args=(model_path,), daemon=True).start()
+    return {'status': 'loading', 'model_path': model_path}
+
+def get_status():
+    return {
+        'status': 'ok',
+        'model': model_info,
+        'loading': pending_load,
+        'last_load_error': last_load_error
+    }
+
 def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, save_json=False):
     global model
     
@@ -255,6 +520,9 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
         if output_path and not os.path.exists(output_path):
             os.makedirs(output_path)
         
+        # Drawing needs the original image, so only detection-only requests use the buffer pool
+        use_pool = buffer_pool is not None and no_draw and os.path.isfile(image_path)
+        
         # Suppress all YOLO output by redirecting stdout temporarily
         import contextlib
         import io
@@ -262,7 +530,7 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
         with contextlib.redirect_stdout(io.StringIO()):
             # Run detection
             results = model(
-                source=image_path,
+                source=buffer_pool.preprocess(image_path) if use_pool else image_path,
                 conf=conf,
                 classes=class_list,
                 save=not no_draw,
@@ -281,10 +549,12 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
             if r.boxes is not None:
                 boxes = r.boxes
                 
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    conf = float(box.conf[0])
-                    cls = int(box.cls[0])
+                # Convert whole columns at once instead of several small tensor ops per box
+                xyxy = boxes.xyxy.cpu().numpy()
+                if use_pool:
+                    xyxy = buffer_pool.scale_boxes(xyxy)
+                
+                for (x1, y1, x2, y2), conf, cls in zip(xyxy.tolist(), boxes.conf.tolist(), boxes.cls.int().tolist()):
                     cls_name = model.names[cls] if cls in model.names else f'class_{cls}'
                     
                     detection = {
@@ -306,7 +576,7 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
             
             # Save JSON if requested
             if save_json and output_path:
-                filename = Path(r.path).stem
+                filename = Path(image_path if use_pool else r.path).stem
                 json_output = {'detections': detections}
                 json_path = os.path.join(output_path, f'{filename}_detection.json')
                 with open(json_path, 'w') as f:
@@ -315,10 +585,34 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
         return {'status': 'successful' if all_detections else 'failed', 'detections': all_detections, 'count': len(all_detections)}
 
 def main():
+    global server_args, buffer_pool, requests_served, baseline_rss_mb, restart_disabled
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='models/prendet_v4.onnx', help='Model path')
+    parser.add_argument('--imgsz', type=int, default=640, help='Input size for models without imgsz metadata')
+    parser.add_argument('--no-buffer-pool', action='store_true', help='Let ultralytics allocate buffers per request')
+    parser.add_argument('--max-rss-mb', type=int, default=0, help='Restart when RSS exceeds this (0 = no limit)')
+    parser.add_argument('--max-restarts', type=int, default=10, help='Stop restarting after this many restarts')
+    parser.add_argument('--tracemalloc', action='store_true', help='Trace Python allocations from startup')
+    parser.add_argument('--tracemalloc-frames', type=int, default=1, help='Stack depth recorded by tracemalloc')
+    server_args = parser.parse_args()
+    
+    if server_args.tracemalloc:
+        tracemalloc.start(server_args.tracemalloc_frames)
+    
     # Load model at startup
-    if not load_model():
+    if not load_model(server_args.model):
         sys.exit(1)
     
+    if not server_args.no_buffer_pool:
+        buffer_pool = BufferPool(model_info['imgsz'])
+    
+    baseline_rss_mb = current_rss_mb()
+    if server_args.max_rss_mb and baseline_rss_mb > server_args.max_rss_mb * RESTART_BASELINE_SHARE:
+        restart_disabled = f'RSS after startup ({baseline_rss_mb:.0f} MB) is close to the limit'
+        print(f'Not restarting on memory growth: {restart_disabled} of {server_args.max_rss_mb} MB',
+              file=sys.stderr, flush=True)
+    
     # Ensure stdout is clean before signaling ready
     sys.stdout.flush()
     print('READY', file=sys.stderr, flush=True)  # Signal that server is ready
@@ -344,6 +638,19 @@ def main():
             # Parse detection request
             request = json.loads(line)
             
+            command = request.get('command')
+            if command == 'load_model':
+                print(json.dumps(start_model_load(request['model_path'])), flush=True)
+                continue
+            
+            if command == 'status':
+                print(json.dumps(get_status()), flush=True)
+                continue
+            
+            if command == 'memory':
+                print(json.dumps(get_memory_status(request.get('top', 10), request.get('tracemalloc'))), flush=True)
+                continue
+            
             result = detect(
                 request['image_path'],
                 request.get('conf', 0.25),
@@ -354,6 +661,8 @@ def main():
             )
             
             print(json.dumps(result), flush=True)
+            requests_served += 1
+            check_memory_limit()
             
         except Exception as e:
             error_result = {
@@ -368,9 +677,6 @@ if __name__ == '__main__':
     main()
 ";
 
-            // Replace the default model path with the provided one
-            scriptContent = scriptContent.Replace("models/pren_det_v3.onnx", modelPath);
-
             await File.WriteAllTextAsync(serverScriptPath, scriptContent);
 
             // Make script executable on Linux
@@ -12,6 +12,7 @@ namespace YoloService.Services
         private readonly PythonEnvironmentManager _environmentManager;
         private readonly PythonScriptManager _scriptManager;
         private readonly string _modelPath;
+        private readonly int _maxRssMb;
         private Process? _pythonProcess;
         private StreamWriter? _processInput;
         private StreamReader? _processOutput;
@@ -24,6 +25,7 @@ namespace YoloService.Services
             _environmentManager = new PythonEnvironmentManager();
             _scriptManager = new PythonScriptManager();
             _modelPath = "models/prendet_v4.onnx";
+            _maxRssMb = 1024; // The Pi has 4 GB shared with the .NET processes
         }
 
         public async Task InitializeAsync()
@@ -41,7 +43,7 @@ namespace YoloService.Services
                 }
 
                 // Create Python server script
-                await _scriptManager.CreateDetectionServerScriptAsync(_modelPath);
+                await _scriptManager.CreateDetectionServerScriptAsync();
 
                 // Start persistent Python process
                 if (await StartPythonServerAsync())
@@ -69,7 +71,7 @@ namespace YoloService.Services
                 var processInfo = new ProcessStartInfo
                 {
                     FileName = _environmentManager.PythonExecutable,
-                    Arguments = $"\"{_scriptManager.ServerScriptPath}\"",
+                    Arguments = $"\"{_scriptManager.ServerScriptPath}\" --model \"{_modelPath}\" --max-rss-mb {_maxRssMb}",
                     UseShellExecute = false,
                     RedirectStandardInput = true,
                     RedirectStandardOutput = true,
@@ -106,7 +108,20 @@ namespace YoloService.Services
                     return false;
                 }
 
-                return await readyTask;
+                if (!await readyTask)
+                    return false;
+
+                // Keep draining stderr so a full pipe never blocks the server (e.g. log lines after a self-restart)
+                _ = Task.Run(async () =>
+                {
+                    string? line;
+                    while ((line = await _pythonProcess.StandardError.ReadLineAsync()) != null)
+                    {
+                        Console.WriteLine($"Python: {line}");
+                    }
+                });
+
+                return true;
             }
             catch (Exception ex)
             {
@@ -115,7 +130,40 @@ namespace YoloService.Services
             }
         }
 
-        public async Task<object> DetectAsync(string imagePath, double confidence, string outputPath, string classes, bool noDraw, bool saveJson)
+        public Task<object> DetectAsync(string imagePath, double confidence, string outputPath, string classes, bool noDraw, bool saveJson)
+        {
+            var request = new
+            {
+                image_path = imagePath,
+                conf = confidence,
+                output_path = outputPath ?? "",
+                classes = classes ?? "",
+                no_draw = noDraw,
+                save_json = saveJson
+            };
+
+            return SendRequestAsync(request);
+        }
+
+        // Loads and warms up the model in the background, the current model keeps serving until the swap
+        public Task<object> LoadModelAsync(string modelPath)
+        {
+            return SendRequestAsync(new { command = "load_model", model_path = modelPath });
+        }
+
+        // Model in use with its load and warm-up time, plus a model that is currently loading
+        public Task<object> GetModelStatusAsync()
+        {
+            return SendRequestAsync(new { command = "status" });
+        }
+
+        // RSS, buffer pool usage and, when tracemalloc is enabled, the top allocation sites
+        public Task<object> GetMemoryStatusAsync(int top = 10, string? tracemalloc = null)
+        {
+            return SendRequestAsync(new { command = "memory", top, tracemalloc });
+        }
+
+        private async Task<object> SendRequestAsync(object request)
         {
             if (!IsModelLoaded || _processInput == null || _processOutput == null)
             {
@@ -125,16 +173,6 @@ namespace YoloService.Services
             await _detectionSemaphore.WaitAsync();
             try
             {
-                var request = new
-                {
-                    image_path = imagePath,
-                    conf = confidence,
-                    output_path = outputPath ?? "",
-                    classes = classes ?? "",
-                    no_draw = noDraw,
-                    save_json = saveJson
-                };
-
                 var requestJson = JsonSerializer.Serialize(request);
                 
                 // Send request to Python process
@@ -7,11 +7,27 @@ import numpy as np
 from ultralytics import YOLO
 import pandas as pd
 from datetime import datetime
+import argparse
+from perf_history import BenchmarkHistory, DEFAULT_DB, stable_hash
+from synthetic_board import add_generator_arguments, generator_from_args
+from detect_service import check_cascade_result, check_cascade_imgsz
+
+# Policies evaluated by --cascade when no policy file is given
+DEFAULT_CASCADE_POLICIES = [
+    {'min_nodes': nodes, 'min_mean_conf': mean_conf, 'required_classes': ['node', 'line']}
+    for nodes in (2, 3, 4)
+    for mean_conf in (0.4, 0.5, 0.6)
+]
 
 class YOLOBenchmark:
-    def __init__(self, models_dir="models", images_dir="images"):
+    def __init__(self, models_dir="models", images_dir="images", history_db=DEFAULT_DB,
+                 synthetic=None, synthetic_count=0):
         self.models_dir = Path(models_dir)
         self.images_dir = Path(images_dir)
+        self.history_db = history_db
+        # Optional SyntheticBoardGenerator used instead of the images directory
+        self.synthetic = synthetic
+        self.synthetic_count = synthetic_count
         self.results = []
         
     def get_model_files(self):
@@ -40,12 +56,29 @@ class YOLOBenchmark:
             images.extend(self.images_dir.glob(f"*{ext}"))
         return images
     
-    def run_inference(self, model, image_path):
+    def count_images(self):
+        """Number of images a benchmark run will process"""
+        if self.synthetic is not None:
+            return self.synthetic_count
+        return len(self.get_image_files())
+    
+    def get_image_sources(self):
+        """Yield (name, path, source) for every benchmark image; synthetic images are rendered on the fly"""
+        if self.synthetic is not None:
+            for name, image, _ in self.synthetic.stream(self.synthetic_count):
+                yield name, 'synthetic', image
+            return
+        
+        for image_path in self.get_image_files():
+            yield image_path.name, str(image_path), image_path
+    
+    def run_inference(self, model, image_path, imgsz=None):
         """Run inference on a single image and return results with timing"""
         start_time = time.time()
         
         try:
-            results = model(image_path, verbose=False)
+            kwargs = {'imgsz': imgsz} if imgsz else {}
+            results = model(image_path, verbose=False, **kwargs)
             inference_time = time.time() - start_time
             
             # Extract detection information
@@ -91,8 +124,8 @@ class YOLOBenchmark:
             print(f"Model loaded in {model_load_time:.3f}s")
             
             # Get all images
-            images = self.get_image_files()
-            if not images:
+            total_images = self.count_images()
+            if not total_images:
                 print("No images found for benchmarking!")
                 return
             
@@ -100,7 +133,7 @@ class YOLOBenchmark:
                 'model_name': model_path.name,
                 'model_path': str(model_path),
                 'model_load_time': model_load_time,
-                'total_images': len(images),
+                'total_images': total_images,
                 'successful_inferences': 0,
                 'failed_inferences': 0,
                 'total_inference_time': 0,
@@ -112,17 +145,17 @@ class YOLOBenchmark:
             }
             
             # Run inference on each image
-            for i, image_path in enumerate(images):
-                print(f"Processing image {i+1}/{len(images)}: {image_path.name}")
+            for i, (image_name, image_path, source) in enumerate(self.get_image_sources()):
+                print(f"Processing image {i+1}/{total_images}: {image_name}")
                 
-                result = self.run_inference(model, image_path)
+                result = self.run_inference(model, source)
                 
                 # Calculate confidence sum for this image
                 image_confidence_sum = sum(det['confidence'] for det in result['detections'])
                 
                 image_result = {
-                    'image_name': image_path.name,
-                    'image_path': str(image_path),
+                    'image_name': image_name,
+                    'image_path': image_path,
                     'success': result['success'],
                     'inference_time': result['inference_time'],
                     'num_detections': result['num_detections'],
@@ -172,12 +205,12 @@ class YOLOBenchmark:
             print("No models found for benchmarking!")
             return
         
-        images = self.get_image_files()
-        if not images:
+        total_images = self.count_images()
+        if not total_images:
             print("No images found for benchmarking!")
             return
             
-        print(f"Found {len(models)} models and {len(images)} images")
+        print(f"Found {len(models)} models and {total_images} images")
         
         benchmark_start = time.time()
         
@@ -198,6 +231,78 @@ class YOLOBenchmark:
         # Save detailed results
         self.save_results()
     
+    def evaluate_cascade(self, cheap_path, heavy_path, policies=None, cheap_imgsz=None):
+        """
+        Evaluate cascade policies on the image set. Both models run once per image;
+        every policy is then replayed on the recorded results.
+        """
+        policies = policies or DEFAULT_CASCADE_POLICIES
+        if cheap_imgsz:
+            check_cascade_imgsz(cheap_path)
+        print(f"Evaluating cascade: {Path(cheap_path).name} -> {Path(heavy_path).name}")
+        
+        cheap = YOLO(str(cheap_path), task='detect')
+        heavy = YOLO(str(heavy_path), task='detect')
+        total_images = self.count_images()
+        
+        samples = []
+        for i, (image_name, _, source) in enumerate(self.get_image_sources()):
+            print(f"Processing image {i+1}/{total_images}: {image_name}")
+            cheap_result = self.run_inference(cheap, source, cheap_imgsz)
+            heavy_result = self.run_inference(heavy, source)
+            if cheap_result['success'] and heavy_result['success']:
+                samples.append((cheap_result, heavy_result))
+        
+        if not samples:
+            print("No successful inferences, cannot evaluate cascade")
+            return []
+        
+        def class_counts(result):
+            counts = {}
+            for det in result['detections']:
+                counts[det['class_name']] = counts.get(det['class_name'], 0) + 1
+            return counts
+        
+        heavy_only = sum(h['inference_time'] for _, h in samples) / len(samples)
+        rows = []
+        for policy in policies:
+            escalations = 0
+            disagreements = 0
+            total_time = 0
+            for cheap_result, heavy_result in samples:
+                total_time += cheap_result['inference_time']
+                if check_cascade_result(cheap_result['detections'], policy) is not None:
+                    escalations += 1
+                    total_time += heavy_result['inference_time']
+                elif class_counts(cheap_result) != class_counts(heavy_result):
+                    disagreements += 1
+            
+            average_time = total_time / len(samples)
+            rows.append({
+                'policy': policy,
+                'escalation_rate': escalations / len(samples),
+                'average_latency': average_time,
+                'average_saved': heavy_only - average_time,
+                'disagreement_rate': disagreements / len(samples),
+            })
+        
+        print(f"\nCascade evaluation on {len(samples)} images, heavy model only: {heavy_only:.3f}s/image")
+        print("-" * 110)
+        print(f"{'Min Nodes':<10} {'Min Conf':<10} {'Required':<20} {'Escalation':<12} "
+              f"{'Avg Latency':<12} {'Avg Saved':<12} {'Disagree':<10}")
+        print("-" * 110)
+        for row in rows:
+            policy = row['policy']
+            print(f"{policy.get('min_nodes', 0):<10} "
+                  f"{policy.get('min_mean_conf', 0):<10.2f} "
+                  f"{','.join(policy.get('required_classes', [])):<20} "
+                  f"{row['escalation_rate']:<12.1%} "
+                  f"{row['average_latency']:<12.3f} "
+                  f"{row['average_saved']:<12.3f} "
+                  f"{row['disagreement_rate']:<10.1%}")
+        print("Disagree: share of images answered by the cheap model whose per-class counts differ from the heavy model")
+        return rows
+    
     def print_summary(self):
         """Print a summary table of all model results"""
         if not self.results:
@@ -249,13 +354,73 @@ class YOLOBenchmark:
         df = pd.DataFrame(summary_data)
         df.to_csv(csv_filename, index=False)
         print(f"Summary saved to: {csv_filename}")
+        
+        if self.history_db:
+            self.save_history()
+    
+    def get_benchmark_config(self, result):
+        """Describe the benchmark setup so only comparable runs are compared"""
+        image_names = sorted(image['image_name'] for image in result['image_results'])
+        config = {
+            'images_dir': str(self.images_dir),
+            'image_set': stable_hash(image_names),
+            'total_images': result['total_images'],
+        }
+        if self.synthetic is not None:
+            config['images_dir'] = 'synthetic'
+            config['synthetic'] = self.synthetic.config
+        return config
+    
+    def save_history(self):
+        """Append the per-image latencies of every model to the benchmark history"""
+        history = BenchmarkHistory(self.history_db)
+        session = datetime.now().strftime('%Y%m%d-%H%M%S-') + str(os.getpid())
+        try:
+            for result in self.results:
+                latencies = [
+                    image['inference_time'] for image in result['image_results'] if image['success']
+                ]
+                if not latencies:
+                    continue
+                run_id = history.record_run(
+                    result['model_path'],
+                    latencies,
+                    self.get_benchmark_config(result),
+                    model_name=result['model_name'],
+                    session=session
+                )
+                print(f"History: stored {result['model_name']} as run {run_id} in {self.history_db}")
+        finally:
+            history.close()
+        print(f"Run 'python perf_history.py --db {self.history_db} compare' to check this session for regressions")
 
 def main():
-    # You can customize the directories here
-    models_dir = "models"
-    images_dir = "images"
+    parser = argparse.ArgumentParser(description='Benchmark YOLO models')
+    parser.add_argument('--models', default='models', help='Models directory')
+    parser.add_argument('--images', default='images', help='Images directory')
+    parser.add_argument('--history-db', default=DEFAULT_DB, help='SQLite benchmark history database')
+    parser.add_argument('--no-history', action='store_true', help='Do not append results to the history')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Benchmark on this many generated boards instead of the images directory')
+    parser.add_argument('--cascade', nargs=2, metavar=('CHEAP', 'HEAVY'),
+                        help='Evaluate cascade policies for a cheap and a heavy model instead of benchmarking')
+    parser.add_argument('--cascade-imgsz', type=int, help='Inference size for the cheap cascade model')
+    parser.add_argument('--cascade-policies', help='JSON file with a list of cascade policies')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    
+    synthetic = generator_from_args(args) if args.synthetic else None
+    benchmark = YOLOBenchmark(args.models, args.images, None if args.no_history else args.history_db,
+                              synthetic, args.synthetic)
+    
+    if args.cascade:
+        policies = None
+        if args.cascade_policies:
+            with open(args.cascade_policies) as f:
+                policies = json.load(f)
+        benchmark.evaluate_cascade(args.cascade[0], args.cascade[1], policies, args.cascade_imgsz)
+        return
     
-    benchmark = YOLOBenchmark(models_dir, images_dir)
     benchmark.run_benchmark()
 
 if __name__ == "__main__":
@@ -6,19 +6,425 @@ import json
 from ultralytics import YOLO
 from pathlib import Path
 import uuid
+import time
+import ast
+import io
+import cv2
+import numpy as np
+import onnxruntime
 
-# Global model variable
+# Global model variables
 model = None
+main_model_path = None
+model_imgsz = None
+
+# Cascade mode: a cheap model answers first, `model` is only used when its result looks wrong
+cascade_model = None
+cascade_imgsz = None
+cascade_policy = {
+    'min_nodes': 3,
+    'min_mean_conf': 0.5,
+    'required_classes': ['node', 'line'],
+}
+cascade_stats = {
+    'images': 0,
+    'escalations': 0,
+    'cheap_time': 0.0,
+    'heavy_time': 0.0,
+    'reasons': {},
+    # Heavy model latency, kept across policy changes as the reference for the saving
+    'heavy_reference': {'time': 0.0, 'images': 0},
+}
+# The CLI handles one request per process, so the counters are kept in this file in the output
+# directory and accumulate over invocations with the same models and policy
+CASCADE_STATS_FILE = 'cascade_stats.json'
+cascade_setup = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+class EndToEndResult:
+    """Minimal stand-in for an ultralytics Results object: source path and drawing"""
+    def __init__(self, path, image, boxes, names):
+        self.path = path
+        self.image = image
+        self.boxes = boxes
+        self.names = names
+    
+    def save(self, filename):
+        image = self.image.copy()
+        for x1, y1, x2, y2, conf, cls in self.boxes.tolist():
+            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+            cv2.putText(image, f'{self.names[int(cls)]} {conf:.2f}', (int(x1), max(int(y1) - 5, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        cv2.imwrite(filename, image)
+
+class EndToEndDetector:
+    """
+    ONNX model exported by export_e2e.py. Decoding, thresholding, class filtering and NMS
+    run inside the graph, so results only need to be scaled back to the original image.
+    """
+    def __init__(self, model_path):
+        self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if metadata.get('e2e') != 'true':
+            raise Exception(f'{model_path} is not an end-to-end model, export it with export_e2e.py')
+        self.names = ast.literal_eval(metadata['names'])
+        imgsz = ast.literal_eval(metadata.get('imgsz', '[640, 640]'))
+        self.imgsz = (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+        self.input_name = self.session.get_inputs()[0].name
+        self.class_ids = np.arange(len(self.names))
+    
+    @staticmethod
+    def is_end_to_end(model_path):
+        # Decided by the metadata export_e2e.py writes, the file may have any name (--output)
+        if Path(model_path).suffix != '.onnx':
+            return False
+        try:
+            return read_onnx_metadata(model_path).get('e2e') == 'true'
+        except (OSError, ValueError):
+            # Missing or unreadable files are left to YOLO() for its error message
+            return False
+    
+    @staticmethod
+    def list_images(source):
+        if isinstance(source, (list, tuple)):
+            return [str(s) for s in source]
+        if os.path.isdir(source):
+            return sorted(str(p) for p in Path(source).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return [str(source)]
+    
+    def letterbox(self, image):
+        """Resize and pad like ultralytics' LetterBox, returns the input tensor"""
+        h0, w0 = image.shape[:2]
+        height, width = self.imgsz
+        gain = min(height / h0, width / w0)
+        new_w, new_h = int(round(w0 * gain)), int(round(h0 * gain))
+        if (new_w, new_h) != (w0, h0):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        dw, dh = (width - new_w) / 2, (height - new_h) / 2
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        tensor = image[..., ::-1].transpose(2, 0, 1)[None]
+        return np.ascontiguousarray(tensor, dtype=np.float32) / 255.0
+    
+    def predict(self, image, conf=0.25, class_list=None):
+        """Return an [n, 6] array (x1, y1, x2, y2, confidence, class) in original image coordinates"""
+        class_mask = np.ones(len(self.names), dtype=np.float32)
+        if class_list is not None:
+            class_mask = np.isin(self.class_ids, class_list).astype(np.float32)
+        
+        detections, count = self.session.run(None, {
+            self.input_name: self.letterbox(image),
+            'class_mask': class_mask,
+            'conf_threshold': np.array([conf], dtype=np.float32),
+        })
+        boxes = detections[0, :int(count[0])]
+        
+        # Undo the letterbox in one step (same rounding as ultralytics' scale_boxes)
+        h0, w0 = image.shape[:2]
+        height, width = self.imgsz
+        gain = min(height / h0, width / w0)
+        pad_x = round((width - w0 * gain) / 2 - 0.1)
+        pad_y = round((height - h0 * gain) / 2 - 0.1)
+        boxes[:, :4] -= (pad_x, pad_y, pad_x, pad_y)
+        boxes[:, :4] /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w0)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h0)
+        return boxes
+    
+    def format_detections(self, boxes):
+        """Convert predict() output to detection dicts with a single conversion per column"""
+        coords = boxes[:, :4].astype(np.int64).tolist()
+        confidences = boxes[:, 4].tolist()
+        class_ids = boxes[:, 5].astype(np.int64).tolist()
+        return [
+            {
+                'bounding_box': {'left': x1, 'top': y1, 'right': x2, 'bottom': y2},
+                'confidence': c,
+                'class_name': self.names[cls],
+                'class_id': cls,
+                'detection_id': str(uuid.uuid4())
+            }
+            for (x1, y1, x2, y2), c, cls in zip(coords, confidences, class_ids)
+        ]
+    
+    def run(self, source, conf, class_list, save, save_dir):
+        """Counterpart of run_model() for end-to-end models"""
+        outputs = []
+        for image_path in self.list_images(source):
+            image = cv2.imread(image_path)
+            if image is None:
+                raise Exception(f'Could not read image: {image_path}')
+            boxes = self.predict(image, conf, class_list)
+            r = EndToEndResult(image_path, image, boxes, self.names)
+            if save:
+                os.makedirs(save_dir, exist_ok=True)
+                r.save(os.path.join(save_dir, Path(image_path).name))
+            outputs.append((r, self.format_detections(boxes)))
+        return outputs
+
+def open_model(model_path):
+    """Load an ultralytics model, or the fast path for models exported by export_e2e.py"""
+    if EndToEndDetector.is_end_to_end(model_path):
+        return EndToEndDetector(model_path)
+    return YOLO(model_path, task='detect')
+
+def _read_varint(f):
+    result = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise EOFError
+        result |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
+
+def _protobuf_fields(f, wanted):
+    """Yield (field number, payload) of the length-delimited `wanted` fields of a protobuf message, skip the rest"""
+    while True:
+        try:
+            key = _read_varint(f)
+        except EOFError:
+            return
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            _read_varint(f)
+        elif wire_type == 1:
+            f.seek(8, os.SEEK_CUR)
+        elif wire_type == 5:
+            f.seek(4, os.SEEK_CUR)
+        elif wire_type == 2:
+            length = _read_varint(f)
+            if field in wanted:
+                yield field, f.read(length)
+            else:
+                f.seek(length, os.SEEK_CUR)
+        else:
+            raise ValueError(f'Unsupported protobuf wire type {wire_type}')
+
+def read_onnx_metadata(model_path):
+    """
+    metadata_props of an ONNX file (ModelProto field 14). The graph is skipped without being
+    parsed, so this is much cheaper than creating an InferenceSession just to read the metadata.
+    """
+    metadata = {}
+    with open(model_path, 'rb') as f:
+        for _, entry in _protobuf_fields(f, {14}):
+            fields = dict(_protobuf_fields(io.BytesIO(entry), {1, 2}))
+            metadata[fields.get(1, b'').decode()] = fields.get(2, b'').decode()
+    return metadata
+
+def onnx_imgsz(model_path):
+    """Input size recorded in the export metadata, None for non-ONNX models"""
+    if Path(model_path).suffix != '.onnx':
+        return None
+    imgsz = read_onnx_metadata(model_path).get('imgsz')
+    return ast.literal_eval(imgsz) if imgsz else None
+
+def check_cascade_imgsz(model_path):
+    """A different inference size only works for models without a fixed input shape"""
+    if EndToEndDetector.is_end_to_end(model_path):
+        raise ValueError(f'{model_path} is an end-to-end model with a fixed input size, --cascade-imgsz is not supported')
+    if Path(model_path).suffix != '.onnx':
+        return
+    # The input shape is part of the graph, only needed when a cascade imgsz is requested
+    session = onnxruntime.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+    if all(isinstance(d, int) for d in session.get_inputs()[0].shape[2:]):
+        raise ValueError(f'{model_path} has a fixed input size, export it with dynamic=True to use --cascade-imgsz')
 
 def load_model(model_path='models/pren_det_v3.onnx'):
-    global model
+    global model, main_model_path
     try:
-        model = YOLO(model_path, task='detect')
+        model = open_model(model_path)
+        main_model_path = model_path
         return True
     except Exception as e:
         print(f'Error loading model: {e}', file=sys.stderr)
         return False
 
+def load_cascade_model(model_path, imgsz=None, policy=None):
+    """
+    Enable cascade mode with a cheap model (or the main model's file at a lower imgsz).
+    The cheap model is always a separate instance: ultralytics keeps predictor arguments
+    between calls, so sharing one object would leak the cheap imgsz into the heavy run.
+    """
+    global cascade_model, cascade_imgsz, model_imgsz, cascade_setup
+    try:
+        if imgsz:
+            check_cascade_imgsz(model_path)
+        cascade_model = open_model(model_path)
+        cascade_imgsz = imgsz
+        # Size for the escalation call; end-to-end models always run at their own input size
+        if not isinstance(model, EndToEndDetector):
+            model_imgsz = onnx_imgsz(main_model_path)
+        if policy:
+            cascade_policy.update(policy)
+        cascade_setup = {
+            'cheap_model': str(model_path),
+            'cheap_imgsz': imgsz,
+            'heavy_model': str(main_model_path),
+            'policy': cascade_policy,
+        }
+        return True
+    except Exception as e:
+        print(f'Error loading cascade model: {e}', file=sys.stderr)
+        return False
+
+def check_cascade_result(detections, policy, class_names=None):
+    """
+    Return the reason why a cheap model result should be escalated, or None if it passes.
+    `class_names` restricts required classes to those that were not filtered out.
+    """
+    nodes = sum(1 for d in detections if d['class_name'] == 'node')
+    if (class_names is None or 'node' in class_names) and nodes < policy.get('min_nodes', 0):
+        return 'too_few_nodes'
+    
+    if detections:
+        mean_conf = sum(d['confidence'] for d in detections) / len(detections)
+        if mean_conf < policy.get('min_mean_conf', 0):
+            return 'low_confidence'
+    elif policy.get('min_mean_conf', 0) > 0:
+        return 'low_confidence'
+    
+    found = {d['class_name'] for d in detections}
+    for name in policy.get('required_classes', []):
+        if (class_names is None or name in class_names) and name not in found:
+            return f'missing_{name}'
+    
+    return None
+
+def load_cascade_stats(save_dir):
+    """Continue the counters stored in save_dir, unless they were recorded with other models or another policy"""
+    try:
+        with open(os.path.join(save_dir, CASCADE_STATS_FILE)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return
+    setup = stored.get('setup') or {}
+    if json.dumps(setup, sort_keys=True) == json.dumps(cascade_setup, sort_keys=True):
+        cascade_stats.update(stored['counters'])
+    elif setup.get('heavy_model') == cascade_setup['heavy_model']:
+        cascade_stats['heavy_reference'] = stored['counters']['heavy_reference']
+
+def save_cascade_stats(save_dir):
+    os.makedirs(save_dir, exist_ok=True)
+    with open(os.path.join(save_dir, CASCADE_STATS_FILE), 'w') as f:
+        json.dump({'setup': cascade_setup, 'counters': cascade_stats}, f, indent=2)
+
+def get_cascade_stats():
+    """
+    Escalation rate and average latency saved compared to always running the heavy model,
+    over all images in CASCADE_STATS_FILE (delete it to start over). The saving is only known
+    once the heavy model has been timed on an escalated image, possibly under another policy.
+    """
+    images = cascade_stats['images']
+    escalations = cascade_stats['escalations']
+    stats = {
+        'images': images,
+        'escalations': escalations,
+        'escalation_rate': escalations / images if images else 0.0,
+        'reasons': dict(cascade_stats['reasons']),
+        'avg_cheap_ms': cascade_stats['cheap_time'] / images * 1000 if images else None,
+        'avg_heavy_ms': None,
+        'avg_saved_ms': None,
+    }
+    reference = cascade_stats['heavy_reference']
+    if reference['images'] and images:
+        heavy_only = reference['time'] / reference['images'] * 1000
+        stats['avg_heavy_ms'] = heavy_only
+        cascade = (cascade_stats['cheap_time'] + cascade_stats['heavy_time']) / images * 1000
+        stats['avg_saved_ms'] = heavy_only - cascade
+    return stats
+
+def format_detections(r, names):
+    detections = []
+    if r.boxes is not None:
+        boxes = r.boxes
+        
+        for box in boxes:
+            x1, y1, x2, y2 = box.xyxy[0].tolist()
+            conf = float(box.conf[0])
+            cls = int(box.cls[0])
+            cls_name = names[cls]
+            
+            detection = {
+                'bounding_box': {
+                    'left': int(x1),
+                    'top': int(y1),
+                    'right': int(x2),
+                    'bottom': int(y2)
+                },
+                'confidence': conf,
+                'class_name': cls_name,
+                'class_id': cls,
+                'detection_id': str(uuid.uuid4())
+            }
+            
+            detections.append(detection)
+    return detections
+
+def run_model(m, source, conf, class_list, save, save_dir, imgsz=None):
+    """Run one model and return (result, detections) pairs"""
+    if isinstance(m, EndToEndDetector):
+        return m.run(source, conf, class_list, save, save_dir)
+    
+    kwargs = {'imgsz': imgsz} if imgsz else {}
+    results = m(
+        source=source,
+        conf=conf,
+        classes=class_list,
+        save=save,
+        save_txt=False,
+        save_conf=True,
+        project=save_dir,
+        name='',
+        exist_ok=True,
+        **kwargs
+    )
+    return [(r, format_detections(r, m.names)) for r in results]
+
+def run_cascade(image_path, conf, class_list, no_draw, save_dir):
+    """Run the cheap model on every image and re-run the failing ones with the heavy model"""
+    start = time.time()
+    cheap = run_model(cascade_model, image_path, conf, class_list, False, save_dir, cascade_imgsz)
+    cascade_stats['cheap_time'] += time.time() - start
+    cascade_stats['images'] += len(cheap)
+    
+    class_names = None
+    if class_list is not None:
+        class_names = {model.names[c] for c in class_list if c in model.names}
+    
+    outputs = []
+    escalate = []
+    for i, (r, detections) in enumerate(cheap):
+        reason = check_cascade_result(detections, cascade_policy, class_names)
+        if reason is None:
+            outputs.append((r, detections))
+            if not no_draw:
+                # The cheap model ran with save=False, so ultralytics did not create the directory
+                os.makedirs(save_dir, exist_ok=True)
+                r.save(filename=os.path.join(save_dir, Path(r.path).name))
+        else:
+            outputs.append(None)
+            escalate.append(i)
+            cascade_stats['reasons'][reason] = cascade_stats['reasons'].get(reason, 0) + 1
+    
+    if escalate:
+        start = time.time()
+        heavy = run_model(model, [cheap[i][0].path for i in escalate], conf, class_list, not no_draw, save_dir,
+                          model_imgsz)
+        heavy_time = time.time() - start
+        cascade_stats['heavy_time'] += heavy_time
+        cascade_stats['escalations'] += len(escalate)
+        cascade_stats['heavy_reference']['time'] += heavy_time
+        cascade_stats['heavy_reference']['images'] += len(escalate)
+        for i, output in zip(escalate, heavy):
+            outputs[i] = output
+    
+    return outputs, len(escalate)
+
 def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, save_json=False):
     global model
     
@@ -37,47 +443,20 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
     if output_path and not os.path.exists(output_path):
         os.makedirs(output_path)
     
+    save_dir = output_path if output_path else 'output'
+    
     # Run detection
-    results = model(
-        source=image_path,
-        conf=conf,
-        classes=class_list,
-        save=not no_draw,
-        save_txt=False,
-        save_conf=True,
-        project=output_path if output_path else 'output',
-        name='',
-        exist_ok=True
-    )
+    escalated = None
+    if cascade_model is not None:
+        load_cascade_stats(save_dir)
+        outputs, escalated = run_cascade(image_path, conf, class_list, no_draw, save_dir)
+        save_cascade_stats(save_dir)
+    else:
+        outputs = run_model(model, image_path, conf, class_list, not no_draw, save_dir)
     
     # Process results
     all_detections = []
-    for r in results:
-        detections = []
-        if r.boxes is not None:
-            boxes = r.boxes
-            
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                conf = float(box.conf[0])
-                cls = int(box.cls[0])
-                cls_name = model.names[cls]
-                
-                detection = {
-                    'bounding_box': {
-                        'left': int(x1),
-                        'top': int(y1),
-                        'right': int(x2),
-                        'bottom': int(y2)
-                    },
-                    'confidence': conf,
-                    'class_name': cls_name,
-                    'class_id': cls,
-                    'detection_id': str(uuid.uuid4())
-                }
-                
-                detections.append(detection)
-        
+    for r, detections in outputs:
         all_detections.extend(detections)
         
         # Save JSON if requested
@@ -88,7 +467,10 @@ def detect(image_path, conf=0.25, output_path='', classes='', no_draw=False, sav
             with open(json_path, 'w') as f:
                 json.dump(json_output, f, indent=2)
     
-    return {'detections': all_detections}
+    result = {'detections': all_detections}
+    if escalated is not None:
+        result['cascade'] = {'escalated': escalated, 'images': len(outputs), 'stats': get_cascade_stats()}
+    return result
 
 def main():
     parser = argparse.ArgumentParser()
@@ -100,6 +482,11 @@ def main():
     parser.add_argument('--classes', default='', help='Classes filter')
     parser.add_argument('--no-draw', action='store_true', help='No drawing')
     parser.add_argument('--json', action='store_true', help='Save JSON')
+    parser.add_argument('--cascade-model', default='', help='Cheap model to run first (enables cascade mode)')
+    parser.add_argument('--cascade-imgsz', type=int, help='Inference size for the cheap model (enables cascade mode)')
+    parser.add_argument('--min-nodes', type=int, default=3, help='Cascade: escalate below this many nodes')
+    parser.add_argument('--min-mean-conf', type=float, default=0.5, help='Cascade: escalate below this mean confidence')
+    parser.add_argument('--required-classes', default='node,line', help='Cascade: escalate if one of these class names is missing')
     
     args = parser.parse_args()
     
@@ -107,6 +494,15 @@ def main():
     if not load_model(args.model):
         sys.exit(1)
     
+    if args.cascade_model or args.cascade_imgsz:
+        policy = {
+            'min_nodes': args.min_nodes,
+            'min_mean_conf': args.min_mean_conf,
+            'required_classes': [c for c in args.required_classes.split(',') if c],
+        }
+        if not load_cascade_model(args.cascade_model or args.model, args.cascade_imgsz, policy):
+            sys.exit(1)
+    
     if args.test:
         print('Model loaded successfully')
         sys.exit(0)
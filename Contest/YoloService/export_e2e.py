@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Export end-to-end detection models.
+
+Takes a YOLO detection model exported by ultralytics (output0: [1, 4 + classes, anchors])
+and appends box decoding, class filtering, confidence thresholding and NonMaxSuppression
+to the ONNX graph. The resulting model outputs a fixed-size [1, max_det, 6] tensor
+(x1, y1, x2, y2, confidence, class) in letterboxed input coordinates plus the number of
+valid rows, so detect_service.py can skip the Python postprocessing entirely.
+
+The confidence/IoU thresholds and the class mask are graph inputs with defaults, so they
+can still be changed per request.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+E2E_SUFFIX = '_e2e'
+
+
+def _opset(model):
+    for entry in model.opset_import:
+        if entry.domain in ('', 'ai.onnx'):
+            return entry.version
+    return 0
+
+
+class GraphBuilder:
+    """Small helper to append nodes and constants to an existing graph"""
+
+    def __init__(self, graph, opset, prefix='e2e/'):
+        self.graph = graph
+        self.opset = opset
+        self.prefix = prefix
+        self.counter = 0
+
+    def name(self, hint):
+        self.counter += 1
+        return f'{self.prefix}{hint}_{self.counter}'
+
+    def const(self, hint, value, dtype=np.float32):
+        tensor = numpy_helper.from_array(np.asarray(value, dtype=dtype), self.name(hint))
+        self.graph.initializer.append(tensor)
+        return tensor.name
+
+    def input_with_default(self, name, value, dtype=np.float32):
+        """Graph input backed by an initializer: callers may override it, otherwise the default is used"""
+        array = np.asarray(value, dtype=dtype)
+        self.graph.initializer.append(numpy_helper.from_array(array, name))
+        elem_type = helper.np_dtype_to_tensor_dtype(array.dtype)
+        self.graph.input.append(helper.make_tensor_value_info(name, elem_type, list(array.shape)))
+        return name
+
+    def op(self, op_type, inputs, hint=None, outputs=1, **attrs):
+        names = [self.name(hint or op_type.lower()) for _ in range(outputs)]
+        self.graph.node.append(helper.make_node(op_type, inputs, names, name=self.name(op_type), **attrs))
+        return names[0] if outputs == 1 else names
+
+    def reduce_max(self, data, axis):
+        if self.opset >= 18:
+            return self.op('ReduceMax', [data, self.const('axes', [axis], np.int64)], keepdims=1)
+        return self.op('ReduceMax', [data], axes=[axis], keepdims=1)
+
+
+def build_end_to_end(model, max_det=300, conf=0.25, iou=0.7):
+    """Append the postprocessing to a loaded ultralytics detection ONNX model (modified in place)"""
+    graph = model.graph
+    opset = _opset(model)
+    # Min on int64 (the detection count) needs opset 12
+    if opset < 12:
+        raise ValueError(f'Model opset {opset} is too old, at least 12 is required')
+    if len(graph.output) != 1:
+        raise ValueError('Expected a single-output YOLO detection model')
+
+    output = graph.output[0]
+    dims = [d.dim_value for d in output.type.tensor_type.shape.dim]
+    if len(dims) != 3 or dims[1] <= 4:
+        raise ValueError(f'Unexpected output shape {dims}, expected [batch, 4 + classes, anchors]')
+    num_classes = dims[1] - 4
+
+    b = GraphBuilder(graph, opset)
+    class_mask = b.input_with_default('class_mask', np.ones(num_classes))
+    conf_threshold = b.input_with_default('conf_threshold', [conf])
+    iou_threshold = b.input_with_default('iou_threshold', [iou])
+
+    # [1, 4 + nc, N] -> [1, N, 4 + nc]
+    pred = b.op('Transpose', [output.name], perm=[0, 2, 1])
+    axis = b.const('axis', [2], np.int64)
+    boxes = b.op('Slice', [pred, b.const('start', [0], np.int64), b.const('end', [4], np.int64), axis])
+    scores = b.op('Slice', [pred, b.const('start', [4], np.int64), b.const('end', [4 + num_classes], np.int64), axis])
+
+    # cx, cy, w, h -> x1, y1, x2, y2 as a single matmul
+    to_xyxy = [[1, 0, 1, 0], [0, 1, 0, 1], [-0.5, 0, 0.5, 0], [0, -0.5, 0, 0.5]]
+    boxes = b.op('MatMul', [boxes, b.const('to_xyxy', to_xyxy)], hint='boxes_xyxy')
+
+    # Keep only the best class per box (like ultralytics), then apply the class filter
+    best = b.reduce_max(scores, 2)
+    is_best = b.op('Cast', [b.op('Equal', [scores, best])], to=TensorProto.FLOAT)
+    scores = b.op('Mul', [b.op('Mul', [scores, is_best]), class_mask])
+    scores = b.op('Transpose', [scores], perm=[0, 2, 1], hint='scores')  # [1, nc, N]
+
+    # [K, 3] rows of (batch, class, box)
+    selected = b.op('NonMaxSuppression', [
+        boxes, scores, b.const('max_det', [max_det], np.int64), iou_threshold, conf_threshold
+    ], hint='selected')
+
+    sel_scores = b.op('GatherND', [scores, selected])
+    sel_boxes = b.op('GatherND', [boxes, b.op('Gather', [selected, b.const('idx', [0, 2], np.int64)], axis=1)])
+    sel_classes = b.op('Cast', [b.op('Gather', [selected, b.const('idx', 1, np.int64)], axis=1)],
+                       to=TensorProto.FLOAT)
+
+    # Highest scores first, at most max_det rows
+    count = b.op('Min', [b.op('Shape', [sel_scores]), b.const('max_det', [max_det], np.int64)], hint='count')
+    top_scores, order = b.op('TopK', [sel_scores, count], outputs=2, axis=0, largest=1, sorted=1)
+    column = b.const('column', [-1, 1], np.int64)
+    detections = b.op('Concat', [
+        b.op('Gather', [sel_boxes, order], axis=0),
+        b.op('Reshape', [top_scores, column]),
+        b.op('Reshape', [b.op('Gather', [sel_classes, order], axis=0), column]),
+    ], axis=1)
+
+    # Pad to a fixed [1, max_det, 6] tensor
+    padded = b.op('Concat', [detections, b.const('zeros', np.zeros((max_det, 6)))], axis=0)
+    padded = b.op('Slice', [padded, b.const('start', [0], np.int64), b.const('end', [max_det], np.int64),
+                            b.const('axis', [0], np.int64)])
+    b.graph.node.append(helper.make_node('Reshape', [padded, b.const('shape', [1, max_det, 6], np.int64)],
+                                         ['detections'], name=b.name('Reshape')))
+    b.graph.node.append(helper.make_node('Identity', [count], ['num_detections'], name=b.name('Identity')))
+
+    graph.output.remove(output)
+    graph.output.extend([
+        helper.make_tensor_value_info('detections', TensorProto.FLOAT, [1, max_det, 6]),
+        helper.make_tensor_value_info('num_detections', TensorProto.INT64, [1]),
+    ])
+
+    metadata = {p.key: p.value for p in model.metadata_props}
+    metadata.update({'e2e': 'true', 'max_det': str(max_det)})
+    del model.metadata_props[:]
+    for key, value in metadata.items():
+        model.metadata_props.add(key=key, value=value)
+
+    # Initializers listed as inputs need IR version 4 or newer
+    model.ir_version = max(model.ir_version, 4)
+    onnx.checker.check_model(model)
+    return model
+
+
+def export(model_path, output_path=None, max_det=300, conf=0.25, iou=0.7):
+    model_path = Path(model_path)
+    output_path = Path(output_path) if output_path else model_path.with_name(f'{model_path.stem}{E2E_SUFFIX}.onnx')
+    model = build_end_to_end(onnx.load(str(model_path)), max_det, conf, iou)
+    onnx.save(model, str(output_path))
+    print(f'Exported end-to-end model to: {output_path}')
+    return output_path
+
+
+def _box_iou(a, b):
+    """IoU matrix between two [n, 4] xyxy arrays"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _as_array(detections):
+    return np.array([
+        [d['bounding_box']['left'], d['bounding_box']['top'], d['bounding_box']['right'],
+         d['bounding_box']['bottom'], d['confidence'], d['class_id']]
+        for d in detections
+    ], dtype=np.float64).reshape(-1, 6)
+
+
+def detections_match(reference, candidate, min_iou=0.9, conf_tol=0.02):
+    """Every reference detection needs a same-class partner with a matching box and confidence"""
+    ref, cand = _as_array(reference), _as_array(candidate)
+    if len(ref) != len(cand):
+        return False
+    if len(ref) == 0:
+        return True
+    iou = _box_iou(ref[:, :4], cand[:, :4])
+    same = (ref[:, None, 5] == cand[None, :, 5]) & (np.abs(ref[:, None, 4] - cand[None, :, 4]) <= conf_tol)
+    return bool(((iou >= min_iou) & same).any(1).all())
+
+
+def verify(model_path, e2e_path, images, conf=0.25, runs=3):
+    """Parity and latency comparison between the Python postprocessing and the end-to-end model"""
+    # Imported here so exporting does not require ultralytics
+    from ultralytics import YOLO
+    from detect_service import EndToEndDetector, run_model
+
+    reference_model = YOLO(str(model_path), task='detect')
+    e2e_model = EndToEndDetector(str(e2e_path))
+
+    image_paths = EndToEndDetector.list_images(images)
+    if not image_paths:
+        print(f'No images found in {images}', file=sys.stderr)
+        return False
+
+    # Warm up both sessions so load time does not count as latency
+    run_model(reference_model, image_paths[0], conf, None, False, 'output')
+    run_model(e2e_model, image_paths[0], conf, None, False, 'output')
+
+    mismatches = 0
+    reference_time = 0.0
+    e2e_time = 0.0
+    for image_path in image_paths:
+        for _ in range(runs):
+            start = time.perf_counter()
+            ((_, reference),) = run_model(reference_model, image_path, conf, None, False, 'output')
+            reference_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            ((_, candidate),) = run_model(e2e_model, image_path, conf, None, False, 'output')
+            e2e_time += time.perf_counter() - start
+
+        if not detections_match(reference, candidate):
+            mismatches += 1
+            print(f'Mismatch on {image_path}: {len(reference)} reference vs {len(candidate)} end-to-end detections')
+
+    total = len(image_paths) * runs
+    print(f'Parity: {len(image_paths) - mismatches}/{len(image_paths)} images match')
+    print(f'Python postprocessing: {reference_time / total * 1000:.1f} ms/image')
+    print(f'End-to-end model:      {e2e_time / total * 1000:.1f} ms/image')
+    print(f'Speedup: {reference_time / e2e_time:.2f}x')
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuse decoding and NMS into a YOLO ONNX model')
+    parser.add_argument('model', help='Ultralytics detection model (.onnx)')
+    parser.add_argument('--output', help=f'Output path (default: <model>{E2E_SUFFIX}.onnx)')
+    parser.add_argument('--max-det', type=int, default=300, help='Fixed number of output rows')
+    parser.add_argument('--conf', type=float, default=0.25, help='Default confidence threshold')
+    parser.add_argument('--iou', type=float, default=0.7, help='Default NMS IoU threshold')
+    parser.add_argument('--verify', help='Image file or directory to run a parity and latency comparison on')
+    args = parser.parse_args()
+
+    output_path = export(args.model, args.output, args.max_det, args.conf, args.iou)
+
+    if args.verify and not verify(args.model, output_path, args.verify, args.conf):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
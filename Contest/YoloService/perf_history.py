@@ -0,0 +1,404 @@
+import sys
+import os
+import math
+import json
+import sqlite3
+import hashlib
+import platform
+import argparse
+from datetime import datetime
+
+DEFAULT_DB = "benchmark_history.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    session TEXT,
+    model_name TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    host_fingerprint TEXT NOT NULL,
+    host_info TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    num_samples INTEGER NOT NULL,
+    mean_latency REAL,
+    median_latency REAL,
+    p95_latency REAL
+);
+CREATE TABLE IF NOT EXISTS latencies (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    latency REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_key ON runs (model_hash, host_fingerprint, config_hash);
+CREATE INDEX IF NOT EXISTS idx_latencies_run ON latencies (run_id);
+"""
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the SHA-256 of a file, used to identify a model independent of its name"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stable_hash(data):
+    """Hash a JSON-serialisable object independent of key order"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _cpu_model():
+    """Best effort CPU model name (Raspberry Pi reports 'Model' instead of 'model name')"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            fields = dict(
+                (key.strip(), value.strip())
+                for key, _, value in (line.partition(':') for line in f)
+                if value
+            )
+        for key in ('model name', 'Model', 'Hardware'):
+            if key in fields:
+                return fields[key]
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _package_version(name):
+    try:
+        module = __import__(name)
+        return getattr(module, '__version__', 'unknown')
+    except ImportError:
+        return None
+
+
+def host_info():
+    """Collect the host properties that influence inference latency"""
+    return {
+        'cpu_model': _cpu_model(),
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'onnxruntime': _package_version('onnxruntime'),
+        'ultralytics': _package_version('ultralytics'),
+    }
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a list, q in [0, 100]"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lower = math.floor(pos)
+    upper = math.ceil(pos)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def mann_whitney_u(baseline, candidate):
+    """
+    One-sided Mann-Whitney U test that candidate latencies are larger than baseline.
+    Uses the normal approximation with tie correction, which is accurate for the
+    sample sizes a benchmark run produces (n >= 8 per group).
+    Returns (u_statistic, p_value).
+    """
+    n1, n2 = len(baseline), len(candidate)
+    if n1 == 0 or n2 == 0:
+        raise ValueError("Both samples must be non-empty")
+
+    combined = sorted([(v, 0) for v in baseline] + [(v, 1) for v in candidate])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        avg_rank = (i + j) / 2.0 + 1
+        for k in range(i, j + 1):
+            ranks[k] = avg_rank
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+
+    rank_sum_candidate = sum(r for r, (_, group) in zip(ranks, combined) if group == 1)
+    u_candidate = rank_sum_candidate - n2 * (n2 + 1) / 2.0
+
+    n = n1 + n2
+    mean_u = n1 * n2 / 2.0
+    var_u = n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if var_u <= 0:
+        return u_candidate, 1.0
+
+    # Continuity correction towards the mean
+    z = (u_candidate - mean_u - 0.5) / math.sqrt(var_u)
+    p_value = 0.5 * math.erfc(z / math.sqrt(2))
+    return u_candidate, p_value
+
+
+class BenchmarkHistory:
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._host_info = None
+
+    def _migrate(self):
+        # Databases created before sessions were recorded lack the column
+        columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(runs)")]
+        if 'session' not in columns:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN session TEXT")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def host(self):
+        if self._host_info is None:
+            self._host_info = host_info()
+        return self._host_info
+
+    def record_run(self, model_path, latencies, config, model_name=None, session=None):
+        """
+        Append one benchmark run (per-image latencies in seconds) and return its id.
+        Runs stored by the same benchmark invocation share a `session` id.
+        """
+        latencies = [float(v) for v in latencies]
+        host = self.host
+        cursor = self.conn.execute(
+            """INSERT INTO runs (timestamp, session, model_name, model_hash, host_fingerprint, host_info,
+                                 config_hash, config, num_samples, mean_latency, median_latency, p95_latency)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                datetime.now().isoformat(timespec='seconds'),
+                session,
+                model_name or os.path.basename(str(model_path)),
+                file_hash(model_path),
+                stable_hash(host),
+                json.dumps(host, sort_keys=True),
+                stable_hash(config),
+                json.dumps(config, sort_keys=True),
+                len(latencies),
+                sum(latencies) / len(latencies) if latencies else None,
+                percentile(latencies, 50),
+                percentile(latencies, 95),
+            )
+        )
+        run_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO latencies (run_id, latency) VALUES (?, ?)",
+            [(run_id, v) for v in latencies]
+        )
+        self.conn.commit()
+        return run_id
+
+    def get_run(self, run_id):
+        return self.conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+
+    def get_latencies(self, run_id):
+        rows = self.conn.execute("SELECT latency FROM latencies WHERE run_id = ?", (run_id,))
+        return [row['latency'] for row in rows]
+
+    def find_runs(self, model=None, same_as=None):
+        """
+        List runs oldest first. `model` matches a model name or hash prefix;
+        `same_as` restricts to runs sharing that run's model, host and configuration.
+        """
+        query = "SELECT * FROM runs"
+        clauses, params = [], []
+        if model:
+            clauses.append("(model_name = ? OR model_hash LIKE ?)")
+            params.extend([model, f"{model}%"])
+        if same_as is not None:
+            clauses.append("model_hash = ? AND host_fingerprint = ? AND config_hash = ?")
+            params.extend([same_as['model_hash'], same_as['host_fingerprint'], same_as['config_hash']])
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        return self.conn.execute(query, params).fetchall()
+
+    def latest_run(self, model=None):
+        runs = self.find_runs(model)
+        return runs[-1] if runs else None
+
+    def latest_session_runs(self):
+        """All runs of the most recent benchmark session (just the latest run if it has no session)"""
+        latest = self.latest_run()
+        if latest is None:
+            return []
+        if latest['session'] is None:
+            return [latest]
+        return self.conn.execute(
+            "SELECT * FROM runs WHERE session = ? ORDER BY id", (latest['session'],)
+        ).fetchall()
+
+    def previous_comparable_run(self, run):
+        """Most recent earlier run on the same host and configuration (any model version)"""
+        return self.conn.execute(
+            """SELECT * FROM runs
+               WHERE id < ? AND model_name = ? AND host_fingerprint = ? AND config_hash = ?
+               ORDER BY id DESC LIMIT 1""",
+            (run['id'], run['model_name'], run['host_fingerprint'], run['config_hash'])
+        ).fetchone()
+
+    def compare(self, baseline_id, candidate_id, alpha=0.05, threshold=0.05):
+        """
+        Compare the candidate run against the baseline run.
+        A regression is reported when the candidate is significantly slower
+        (p < alpha) and its median latency grew by more than `threshold`.
+        """
+        baseline = self.get_latencies(baseline_id)
+        candidate = self.get_latencies(candidate_id)
+        if not baseline or not candidate:
+            raise ValueError("Both runs need stored latencies to be compared")
+
+        u_stat, p_value = mann_whitney_u(baseline, candidate)
+        baseline_median = percentile(baseline, 50)
+        candidate_median = percentile(candidate, 50)
+        change = (candidate_median - baseline_median) / baseline_median if baseline_median else 0.0
+
+        return {
+            'baseline_id': baseline_id,
+            'candidate_id': candidate_id,
+            'baseline_median': baseline_median,
+            'candidate_median': candidate_median,
+            'relative_change': change,
+            'u_statistic': u_stat,
+            'p_value': p_value,
+            'regression': p_value < alpha and change > threshold,
+        }
+
+    def print_trend(self, model=None, limit=20):
+        """Print the stored history as a table with the change relative to the previous run"""
+        runs = self.find_runs(model)[-limit:]
+        if not runs:
+            print("No benchmark runs stored yet")
+            return
+
+        print(f"{'Run':<5} {'Timestamp':<20} {'Model':<25} {'Hash':<9} {'Host':<9} {'Config':<9} "
+              f"{'N':<6} {'Mean (s)':<10} {'Median (s)':<11} {'P95 (s)':<10} {'Change':<8}")
+        print("-" * 130)
+
+        previous_median = {}
+        for run in runs:
+            key = (run['model_name'], run['host_fingerprint'], run['config_hash'])
+            change = ""
+            if key in previous_median and previous_median[key] and run['median_latency'] is not None:
+                delta = (run['median_latency'] - previous_median[key]) / previous_median[key]
+                change = f"{delta:+.1%}"
+            previous_median[key] = run['median_latency']
+
+            print(f"{run['id']:<5} {run['timestamp']:<20} {run['model_name']:<25} "
+                  f"{run['model_hash'][:8]:<9} {run['host_fingerprint'][:8]:<9} {run['config_hash'][:8]:<9} "
+                  f"{run['num_samples']:<6} {run['mean_latency'] or 0:<10.4f} "
+                  f"{run['median_latency'] or 0:<11.4f} {run['p95_latency'] or 0:<10.4f} {change:<8}")
+
+
+def report_comparison(history, baseline, candidate, args):
+    """Print the comparison of two runs and return True when the candidate regressed"""
+    if baseline['host_fingerprint'] != candidate['host_fingerprint']:
+        print("Warning: baseline and candidate were recorded on different hosts", file=sys.stderr)
+    if baseline['config_hash'] != candidate['config_hash']:
+        print("Warning: baseline and candidate use different benchmark configurations", file=sys.stderr)
+
+    result = history.compare(baseline['id'], candidate['id'], args.alpha, args.threshold)
+
+    print(f"Baseline:  run {baseline['id']} ({baseline['model_name']}, {baseline['timestamp']}) "
+          f"median {result['baseline_median']:.4f}s")
+    print(f"Candidate: run {candidate['id']} ({candidate['model_name']}, {candidate['timestamp']}) "
+          f"median {result['candidate_median']:.4f}s")
+    print(f"Change: {result['relative_change']:+.1%}, Mann-Whitney U={result['u_statistic']:.1f}, "
+          f"p={result['p_value']:.4g}")
+
+    if result['regression']:
+        print("REGRESSION: candidate is significantly slower than the baseline")
+    else:
+        print("No significant regression")
+    return result['regression']
+
+
+def cmd_compare(history, args):
+    if args.run or args.model or args.baseline:
+        candidate = history.get_run(args.run) if args.run else history.latest_run(args.model)
+        if candidate is None:
+            print("No candidate run found", file=sys.stderr)
+            return 2
+
+        baseline = history.get_run(args.baseline) if args.baseline else history.previous_comparable_run(candidate)
+        if baseline is None:
+            print(f"No baseline run found for run {candidate['id']} ({candidate['model_name']})", file=sys.stderr)
+            return 2
+
+        return 1 if report_comparison(history, baseline, candidate, args) else 0
+
+    # Default: every model of the latest benchmark session against its previous comparable run
+    candidates = history.latest_session_runs()
+    if not candidates:
+        print("No candidate run found", file=sys.stderr)
+        return 2
+
+    compared = 0
+    regressions = []
+    for candidate in candidates:
+        baseline = history.previous_comparable_run(candidate)
+        if baseline is None:
+            print(f"No baseline run found for run {candidate['id']} ({candidate['model_name']}), skipping\n")
+            continue
+        compared += 1
+        if report_comparison(history, baseline, candidate, args):
+            regressions.append(candidate['model_name'])
+        print()
+
+    if not compared:
+        print("No run of the latest session has a comparable baseline", file=sys.stderr)
+        return 2
+    if regressions:
+        print(f"REGRESSION in {len(regressions)} of {compared} models: {', '.join(regressions)}")
+        return 1
+    print(f"No significant regression in {compared} models")
+    return 0
+
+
+def cmd_trend(history, args):
+    history.print_trend(args.model, args.limit)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark history and regression detection')
+    parser.add_argument('--db', default=DEFAULT_DB, help='Path to the SQLite history database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compare_parser = subparsers.add_parser('compare', help='Test the latest benchmark session against baselines')
+    compare_parser.add_argument('--model', help='Only compare the latest run of this model name or hash prefix')
+    compare_parser.add_argument('--run', type=int, help='Candidate run id (default: every run of the latest session)')
+    compare_parser.add_argument('--baseline', type=int, help='Baseline run id (default: previous comparable run)')
+    compare_parser.add_argument('--alpha', type=float, default=0.05, help='Significance level')
+    compare_parser.add_argument('--threshold', type=float, default=0.05,
+                                help='Minimum relative median slowdown to count as regression')
+
+    trend_parser = subparsers.add_parser('trend', help='Show the stored history')
+    trend_parser.add_argument('--model', help='Model name or hash prefix')
+    trend_parser.add_argument('--limit', type=int, default=20, help='Number of most recent runs to show')
+
+    args = parser.parse_args()
+
+    history = BenchmarkHistory(args.db)
+    try:
+        if args.command == 'compare':
+            return cmd_compare(history, args)
+        return cmd_trend(history, args)
+    finally:
+        history.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Soak test for the persistent detection server (detect_server.py, generated by YoloService).
+
+Starts the server, sends many detection requests for synthetic boards over its stdin/stdout
+protocol and samples the resident memory of the process. Memory has to stay flat after
+warm-up; the test fails when it grows by more than --max-growth-mb or when more than
+--max-errors requests fail.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+
+from synthetic_board import add_generator_arguments, generator_from_args, write_ring
+
+
+def process_rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def linear_slope(xs, ys):
+    """Least-squares slope of ys over xs"""
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+
+class DetectionServer:
+    def __init__(self, server_script, python, server_args):
+        self.process = subprocess.Popen(
+            [python, server_script] + server_args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=sys.stderr,
+            text=True,
+            bufsize=1
+        )
+
+    def request(self, payload):
+        self.process.stdin.write(json.dumps(payload) + '\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError('Detection server exited')
+        return json.loads(line)
+
+    def wait_ready(self):
+        # PING is answered once the model is loaded
+        start = time.time()
+        self.process.stdin.write('PING\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError('Detection server failed to start')
+        return time.time() - start
+
+    def close(self):
+        try:
+            self.process.stdin.write('EXIT\n')
+            self.process.stdin.flush()
+            self.process.wait(10)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test the persistent detection server')
+    parser.add_argument('--server', default='detect_server.py', help='Path to the generated detect_server.py')
+    parser.add_argument('--python', default=sys.executable, help='Python interpreter for the server')
+    parser.add_argument('--model', default='models/prendet_v4.onnx', help='Model path')
+    parser.add_argument('--requests', type=int, default=10000, help='Number of detection requests')
+    parser.add_argument('--sample-every', type=int, default=100, help='Sample RSS every N requests')
+    parser.add_argument('--warmup', type=float, default=0.1, help='Share of requests ignored as warm-up')
+    parser.add_argument('--max-growth-mb', type=float, default=20.0, help='Allowed RSS growth after warm-up')
+    parser.add_argument('--max-errors', type=int, default=0, help='Allowed number of failed requests')
+    parser.add_argument('--max-rss-mb', type=int, default=0, help='Passed to the server (0 = no limit)')
+    parser.add_argument('--tracemalloc', action='store_true', help='Report top allocation sites at the end')
+    parser.add_argument('--ring-dir', default='synthetic_ring', help='Directory for the reused test images')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.server):
+        print(f'Server script not found: {args.server} (it is generated when YoloService starts)', file=sys.stderr)
+        return 1
+
+    server_args = ['--model', args.model]
+    if args.max_rss_mb:
+        server_args += ['--max-rss-mb', str(args.max_rss_mb)]
+    if args.tracemalloc:
+        server_args.append('--tracemalloc')
+
+    server = DetectionServer(args.server, args.python, server_args)
+    try:
+        print(f'Server ready after {server.wait_ready():.1f}s')
+        generator = generator_from_args(args)
+
+        samples = []
+        errors = 0
+        start = time.time()
+        for i, (image_path, _) in enumerate(write_ring(generator.stream(args.requests), args.ring_dir)):
+            response = server.request({'image_path': image_path, 'conf': 0.25, 'no_draw': True})
+            if response.get('status') == 'error':
+                errors += 1
+
+            if (i + 1) % args.sample_every == 0:
+                rss = process_rss_mb(server.process.pid)
+                samples.append((i + 1, rss))
+                print(f'{i + 1:>6} requests  RSS {rss:7.1f} MB  {(i + 1) / (time.time() - start):6.1f} req/s')
+
+        memory = server.request({'command': 'memory', 'top': 10})
+    finally:
+        server.close()
+
+    steady = [(n, rss) for n, rss in samples if n > args.requests * args.warmup]
+    if len(steady) < 2:
+        print('Not enough samples after warm-up', file=sys.stderr)
+        return 1
+
+    growth = steady[-1][1] - steady[0][1]
+    slope = linear_slope([n for n, _ in steady], [rss for _, rss in steady]) * 1000
+
+    print(f'\nRequests: {args.requests}, errors: {errors}, server restarts: {memory.get("restarts", 0)}')
+    print(f'RSS after warm-up: {steady[0][1]:.1f} MB, final: {steady[-1][1]:.1f} MB, '
+          f'peak: {max(rss for _, rss in samples):.1f} MB')
+    print(f'Growth: {growth:+.1f} MB ({slope:+.2f} MB per 1000 requests)')
+    if memory.get('buffer_pool'):
+        print(f'Buffer pool: {memory["buffer_pool"]}')
+    for entry in memory.get('top_allocations', []):
+        print(f'  {entry["size_kb"]:10.1f} KB  {entry["count"]:8}  {entry["location"]}')
+
+    failed = False
+    if errors > args.max_errors:
+        # A server that fails every request does little work and would look flat
+        print(f'FAIL: {errors} requests failed (allowed: {args.max_errors})')
+        failed = True
+    if growth > args.max_growth_mb:
+        print(f'FAIL: memory grew by more than {args.max_growth_mb} MB')
+        failed = True
+    if failed:
+        return 1
+
+    print('PASS: memory use is flat')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
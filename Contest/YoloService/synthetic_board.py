@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Synthetic contest board generator.
+
+Renders boards with nodes, pylons (traffic cones), lines and barriers at positions
+taken from recorded layouts (winning_run.json, PathPlaning/images/*.json,
+*_detection.json files) and produces ground truth in the same schema that
+detect() returns. Images are generated on the fly, so thousands of them can be
+streamed into the benchmark or the load tester without touching the disk.
+"""
+import os
+import sys
+import json
+import math
+import uuid
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+DEFAULT_LAYOUTS = [
+    REPO_ROOT / 'winning_run.json',
+    REPO_ROOT / 'PathPlaning' / 'images',
+    REPO_ROOT / 'Contest' / 'PfadfinderMain' / 'imgrec' / 'output' / 'startimage_detection.json',
+]
+
+# Class ids as trained into our detection models
+CLASS_IDS = {
+    'barrier_red': 0,
+    'barrier_white': 1,
+    'line': 2,
+    'node': 3,
+    'traffic_cone': 4,
+}
+
+
+def _anchor_of(detection):
+    """Point a detection connects to: lower centre for cones, centre otherwise"""
+    box = detection['bounding_box']
+    x = (box['left'] + box['right']) / 2
+    if detection['class_name'] in ('traffic_cone', 'pylon'):
+        return x, box['bottom']
+    return x, (box['top'] + box['bottom']) / 2
+
+
+def _line_from_box(box, anchors):
+    """A line detection only has a box; pick the diagonal whose ends lie closest to known anchors"""
+    corners_a = ((box['left'], box['top']), (box['right'], box['bottom']))
+    corners_b = ((box['left'], box['bottom']), (box['right'], box['top']))
+
+    def cost(corners):
+        if not anchors:
+            return 0
+        return sum(min(math.dist(c, a) for a in anchors) for c in corners)
+
+    (x1, y1), (x2, y2) = min((corners_a, corners_b), key=cost)
+    return x1, y1, x2, y2
+
+
+def parse_layout(data):
+    """Convert a layout JSON (PathPlaning or detect() schema) into normalized board coordinates"""
+    nodes, pylons, lines, barriers = [], [], [], []
+
+    if 'detections' in data:
+        detections = data['detections']
+        for det in detections:
+            name = det['class_name']
+            if name == 'node':
+                nodes.append(_anchor_of(det))
+            elif name in ('traffic_cone', 'pylon'):
+                pylons.append(_anchor_of(det))
+            elif name.startswith('barrier'):
+                barriers.append(_anchor_of(det))
+        anchors = nodes + pylons
+        for det in detections:
+            if det['class_name'] == 'line':
+                lines.append(_line_from_box(det['bounding_box'], anchors))
+        width = max((d['bounding_box']['right'] for d in detections), default=640)
+        height = max((d['bounding_box']['bottom'] for d in detections), default=640)
+    else:
+        nodes = [(n['x'], n['y']) for n in data.get('Nodes', [])]
+        pylons = [(p['x'], p['y']) for p in data.get('Pylons', [])]
+        lines = [(l['xStart'], l['yStart'], l['xEnd'], l['yEnd']) for l in data.get('Lines', [])]
+        width = data.get('image_width', 640)
+        height = data.get('image_height', 640)
+
+    # Some hand-made layouts use coordinates outside the declared image size
+    xs = [p[0] for p in nodes + pylons + barriers] + [v for l in lines for v in (l[0], l[2])]
+    ys = [p[1] for p in nodes + pylons + barriers] + [v for l in lines for v in (l[1], l[3])]
+    width = max([width] + [x * 1.05 for x in xs])
+    height = max([height] + [y * 1.05 for y in ys])
+
+    return {
+        'nodes': [(x / width, y / height) for x, y in nodes],
+        'pylons': [(x / width, y / height) for x, y in pylons],
+        'barriers': [(x / width, y / height) for x, y in barriers],
+        'lines': [(x1 / width, y1 / height, x2 / width, y2 / height) for x1, y1, x2, y2 in lines],
+    }
+
+
+def load_layouts(paths=None):
+    """Load all layout files from the given files/directories (defaults to the recorded boards)"""
+    layouts = []
+    for path in map(Path, paths or DEFAULT_LAYOUTS):
+        files = sorted(path.glob('*.json')) if path.is_dir() else [path]
+        for file in files:
+            if not file.exists():
+                continue
+            try:
+                with open(file) as f:
+                    layout = parse_layout(json.load(f))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping layout {file}: {e}", file=sys.stderr)
+                continue
+            if layout['nodes'] or layout['lines']:
+                layouts.append(layout)
+    return layouts
+
+
+class SyntheticBoardGenerator:
+    def __init__(self, layouts=None, width=640, height=640, noise=8.0, lighting=0.3,
+                 jitter=0.02, blur=1, barrier_prob=0.1, seed=0):
+        self.layouts = layouts if layouts is not None else load_layouts()
+        if not self.layouts:
+            raise ValueError("No board layouts available")
+        self.width = width
+        self.height = height
+        self.noise = noise
+        self.lighting = lighting
+        self.jitter = jitter
+        self.blur = blur
+        self.barrier_prob = barrier_prob
+        self.seed = seed
+
+    @property
+    def config(self):
+        """Parameters that define the generated image set"""
+        return {
+            'generator': 'synthetic_board',
+            'layouts': len(self.layouts),
+            'width': self.width,
+            'height': self.height,
+            'noise': self.noise,
+            'lighting': self.lighting,
+            'jitter': self.jitter,
+            'blur': self.blur,
+            'barrier_prob': self.barrier_prob,
+            'seed': self.seed,
+        }
+
+    def _transform(self, rng):
+        """Random camera pose: small rotation, scale and shift around the image centre"""
+        angle = rng.uniform(-5, 5)
+        scale = rng.uniform(0.9, 1.05)
+        matrix = cv2.getRotationMatrix2D((self.width / 2, self.height / 2), angle, scale)
+        matrix[0, 2] += rng.uniform(-0.03, 0.03) * self.width
+        matrix[1, 2] += rng.uniform(-0.03, 0.03) * self.height
+        return matrix
+
+    def _project(self, points, matrix, rng):
+        """Map normalized layout points to pixels with per-point jitter"""
+        if len(points) == 0:
+            return np.zeros((0, 2))
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        pts = pts + rng.normal(0, self.jitter / 3, pts.shape)
+        pts = pts * (self.width, self.height)
+        return pts @ matrix[:, :2].T + matrix[:, 2]
+
+    def _background(self, rng):
+        base = rng.uniform(90, 170)
+        tint = rng.uniform(-12, 12, 3)
+        image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        image[:] = np.clip(base + tint, 0, 255)
+        return image
+
+    def _lighting(self, rng):
+        """Per-pixel gain of a linear lighting gradient in a random direction"""
+        direction = rng.uniform(0, 2 * math.pi)
+        ys, xs = np.mgrid[0:self.height, 0:self.width].astype(np.float32)
+        ramp = (xs / self.width - 0.5) * math.cos(direction) + (ys / self.height - 0.5) * math.sin(direction)
+        return 1 + self.lighting * ramp * 2 + rng.uniform(-self.lighting, self.lighting) / 2
+
+    def render(self, index):
+        """Render board number `index`; identical index and settings give identical images"""
+        rng = np.random.default_rng((self.seed, index))
+        layout = self.layouts[index % len(self.layouts)]
+        unit = min(self.width, self.height)
+        matrix = self._transform(rng)
+
+        image = self._background(rng)
+        detections = []
+
+        def add(class_name, left, top, right, bottom):
+            left, right = np.clip([left, right], 0, self.width - 1)
+            top, bottom = np.clip([top, bottom], 0, self.height - 1)
+            if right - left < 2 or bottom - top < 2:
+                return
+            detections.append({
+                'bounding_box': {
+                    'left': int(left),
+                    'top': int(top),
+                    'right': int(right),
+                    'bottom': int(bottom)
+                },
+                'confidence': 1.0,
+                'class_name': class_name,
+                'class_id': CLASS_IDS[class_name],
+                'detection_id': str(uuid.uuid5(uuid.NAMESPACE_OID, f'{self.seed}/{index}/{len(detections)}'))
+            })
+
+        # Lines (tape) are drawn first so nodes and cones cover their ends
+        starts = self._project([l[:2] for l in layout['lines']], matrix, rng)
+        ends = self._project([l[2:] for l in layout['lines']], matrix, rng)
+        thickness = max(2, int(unit * rng.uniform(0.008, 0.014)))
+        tape_color = np.full(3, rng.uniform(200, 250)) + rng.uniform(-8, 8, 3)
+        barrier_points = list(self._project(layout['barriers'], matrix, rng))
+        for start, end in zip(starts, ends):
+            p1 = tuple(int(v) for v in start)
+            p2 = tuple(int(v) for v in end)
+            cv2.line(image, p1, p2, tape_color.tolist(), thickness, cv2.LINE_AA)
+            half = thickness / 2
+            add('line', min(p1[0], p2[0]) - half, min(p1[1], p2[1]) - half,
+                max(p1[0], p2[0]) + half, max(p1[1], p2[1]) + half)
+            if rng.random() < self.barrier_prob:
+                barrier_points.append((start + end) / 2)
+
+        radius = unit * rng.uniform(0.018, 0.028)
+        for x, y in self._project(layout['nodes'], matrix, rng):
+            r = radius * rng.uniform(0.9, 1.1)
+            center = (int(x), int(y))
+            cv2.circle(image, center, int(r), (40, 40, 40), -1, cv2.LINE_AA)
+            cv2.circle(image, center, max(1, int(r * 0.45)), (230, 230, 230), -1, cv2.LINE_AA)
+            add('node', x - r, y - r, x + r, y + r)
+
+        for x, y in barrier_points:
+            red = rng.random() < 0.5
+            w, h = unit * 0.05, unit * 0.03
+            color = (40, 40, 200) if red else (235, 235, 235)
+            cv2.rectangle(image, (int(x - w / 2), int(y - h)), (int(x + w / 2), int(y)), color, -1)
+            cv2.rectangle(image, (int(x - w / 2), int(y - h)), (int(x + w / 2), int(y)), (30, 30, 30), 1)
+            add('barrier_red' if red else 'barrier_white', x - w / 2, y - h, x + w / 2, y)
+
+        for x, y in self._project(layout['pylons'], matrix, rng):
+            h = unit * rng.uniform(0.07, 0.1)
+            w = h * 0.55
+            cone = np.array([(x - w / 2, y), (x + w / 2, y), (x, y - h)], dtype=np.int32)
+            cv2.fillConvexPoly(image, cone, (20, 110, 245), cv2.LINE_AA)
+            stripe_y = y - h * 0.5
+            cv2.line(image, (int(x - w * 0.25), int(stripe_y)), (int(x + w * 0.25), int(stripe_y)),
+                     (240, 240, 240), max(1, int(h * 0.1)))
+            add('traffic_cone', x - w / 2, y - h, x + w / 2, y)
+
+        image = image.astype(np.float32)
+        if self.lighting > 0:
+            image *= self._lighting(rng)[..., None]
+        if self.blur > 0:
+            k = 2 * self.blur + 1
+            image = cv2.GaussianBlur(image, (k, k), 0)
+        if self.noise > 0:
+            image += rng.normal(0, self.noise, image.shape).astype(np.float32)
+
+        image = np.clip(image, 0, 255).astype(np.uint8)
+        return image, {'detections': detections}
+
+    def stream(self, count, start=0):
+        """Yield (name, image, ground_truth) for `count` boards without writing anything"""
+        for index in range(start, start + count):
+            image, ground_truth = self.render(index)
+            yield f'synthetic_{index:06d}', image, ground_truth
+
+
+def write_ring(stream, directory, slots=4, quality=90):
+    """
+    Write streamed images into a fixed set of slot files and yield (path, ground_truth).
+    Consumers that need a file path (e.g. the detection server) get one while disk
+    usage stays bounded to `slots` images.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for i, (name, image, ground_truth) in enumerate(stream):
+        path = os.path.abspath(os.path.join(directory, f'slot_{i % slots}.jpg'))
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        yield path, ground_truth
+
+
+def parse_resolution(value):
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Resolution must look like 1920x1080')
+    if not (0 < width <= 1920 and 0 < height <= 1080):
+        raise argparse.ArgumentTypeError('Resolution is limited to 1920x1080')
+    return width, height
+
+
+def add_generator_arguments(parser):
+    """Generator options shared by this script, the benchmark and the load tester"""
+    parser.add_argument('--layouts', nargs='*', help='Layout JSON files or directories')
+    parser.add_argument('--resolution', type=parse_resolution, default=(640, 640), help='WIDTHxHEIGHT')
+    parser.add_argument('--noise', type=float, default=8.0, help='Gaussian noise sigma')
+    parser.add_argument('--lighting', type=float, default=0.3, help='Lighting gradient strength (0-1)')
+    parser.add_argument('--blur', type=int, default=1, help='Gaussian blur radius in pixels')
+    parser.add_argument('--barrier-prob', type=float, default=0.1, help='Chance of a barrier on each line')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+
+def generator_from_args(args):
+    width, height = args.resolution
+    return SyntheticBoardGenerator(
+        load_layouts(args.layouts),
+        width=width,
+        height=height,
+        noise=args.noise,
+        lighting=args.lighting,
+        blur=args.blur,
+        barrier_prob=args.barrier_prob,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic contest boards')
+    parser.add_argument('--count', type=int, default=100, help='Number of images')
+    parser.add_argument('--output', required=True, help='Output directory')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    generator = generator_from_args(args)
+    os.makedirs(args.output, exist_ok=True)
+
+    for name, image, ground_truth in generator.stream(args.count):
+        cv2.imwrite(os.path.join(args.output, f'{name}.jpg'), image)
+        with open(os.path.join(args.output, f'{name}_detection.json'), 'w') as f:
+            json.dump(ground_truth, f, indent=2)
+
+    print(f'Generated {args.count} images in {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
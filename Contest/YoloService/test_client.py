@@ -1,6 +1,9 @@
 import asyncio
 import websockets
 import json
+import argparse
+import time
+from synthetic_board import add_generator_arguments, generator_from_args, write_ring
 
 async def test_websocket():
     uri = "ws://localhost:5000/ws"
@@ -40,5 +43,54 @@ async def test_websocket():
     except Exception as e:
         print(f"Error: {e}")
 
+async def load_test(count, generator, ring_dir, confidence=0.5):
+    """Send `count` detection requests for synthetic boards and report latency statistics"""
+    uri = "ws://localhost:5000/ws"
+    latencies = []
+    errors = 0
+    
+    async with websockets.connect(uri) as websocket:
+        print(f"Connected, sending {count} synthetic detection requests")
+        start = time.time()
+        
+        for i, (image_path, ground_truth) in enumerate(write_ring(generator.stream(count), ring_dir)):
+            request_start = time.time()
+            await websocket.send(json.dumps({
+                "command": "detect",
+                "image_path": image_path,
+                "confidence": confidence,
+                "no_draw": True,
+                "save_json": False
+            }))
+            response = json.loads(await websocket.recv())
+            latencies.append(time.time() - request_start)
+            
+            result = response.get("result")
+            if response.get("response") != "detection_complete" or (
+                    isinstance(result, dict) and result.get("status") == "error"):
+                errors += 1
+            
+            if (i + 1) % 100 == 0:
+                print(f"{i + 1}/{count} requests, last latency {latencies[-1] * 1000:.1f} ms")
+        
+        total_time = time.time() - start
+    
+    latencies.sort()
+    print(f"Requests: {len(latencies)}, errors: {errors}")
+    print(f"Throughput: {len(latencies) / total_time:.2f} req/s")
+    print(f"Latency mean: {sum(latencies) / len(latencies) * 1000:.1f} ms, "
+          f"p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
 if __name__ == "__main__":
-    asyncio.run(test_websocket())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='YoloService WebSocket test client')
+    parser.add_argument('--load', type=int, default=0, help='Run a load test with this many synthetic boards')
+    parser.add_argument('--ring-dir', default='synthetic_ring', help='Directory for the reused load test images')
+    parser.add_argument('--confidence', type=float, default=0.5, help='Confidence threshold')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.load:
+        asyncio.run(load_test(args.load, generator_from_args(args), args.ring_dir, args.confidence))
+    else:
+        asyncio.run(test_websocket())